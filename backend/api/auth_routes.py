@@ -1,20 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from users.models import User
 from users.schemas import UserCreate, UserLogin, AuthResponse
-from users.auth import hash_password, verify_password, create_access_token
+from users.auth import hash_password, verify_password_async, create_access_token, DUMMY_HASH
 from users.database import get_db
 
 router = APIRouter()
 
 @router.post("/signup", response_model=AuthResponse)
 async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).filter_by(email=user.email))
-    if result.scalars().first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-
     db_user = User(
         email=user.email,
         hashed_password=hash_password(user.password),
@@ -24,8 +21,13 @@ async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
         verified=user.verified,
     )
     db.add(db_user)
-    await db.commit()
-    await db.refresh(db_user)
+    try:
+        # Single INSERT round-trip; the unique index on email reports the
+        # duplicate instead of a separate existence SELECT
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
     access_token = create_access_token({"sub": db_user.email})
     return {
         "id": db_user.id,
@@ -40,19 +42,34 @@ async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
 
 @router.post("/login", response_model=AuthResponse)
 async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).filter_by(email=credentials.email))
-    user = result.scalars().first()
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    # Core column select: a plain row fetch skips ORM instance construction
+    # and identity-map bookkeeping we don't need for a login check
+    stmt = select(
+        User.id,
+        User.email,
+        User.first_name,
+        User.last_name,
+        User.address,
+        User.verified,
+        User.hashed_password,
+    ).where(User.email == credentials.email)
+    row = (await db.execute(stmt)).first()
+    if not row:
+        # Burn a verification against a dummy hash so unknown emails take as
+        # long as wrong passwords (no user-enumeration timing side channel)
+        await verify_password_async(credentials.password, DUMMY_HASH)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    
-    access_token = create_access_token({"sub": user.email})
+    if not await verify_password_async(credentials.password, row.hashed_password):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+    access_token = create_access_token({"sub": row.email})
     return {
-        "id": user.id,
-        "email": user.email,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "address": user.address,
-        "verified": user.verified,
+        "id": row.id,
+        "email": row.email,
+        "first_name": row.first_name,
+        "last_name": row.last_name,
+        "address": row.address,
+        "verified": row.verified,
         "access_token": access_token,
         "token_type": "bearer"
     }
\ No newline at end of file
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Any, Optional, TypedDict
+from pydantic import BaseModel, ConfigDict, Field
 
-from services.vector_store import VectorStoreService
-from services.rag_service import RAGService
+# The service classes only appear as Depends() factories below; importing
+# them here would drag the langchain/torch stack in at router import time
 from dependencies import get_vector_service, get_rag_service
 from users.models import User
 from users.auth import hash_password, verify_password
@@ -12,11 +13,15 @@ from users.schemas import UserCreate, UserRead, UserLogin, Token
 router = APIRouter()
 
 # Request/Response models
-class ChatMessage(BaseModel):
+class ChatMessage(TypedDict):
+    # TypedDict so validated messages are already plain dicts — no
+    # per-message .dict() rebuild on the query hot path
     type: str
     content: str
 
 class QueryRequest(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     question: str = Field(..., description="The user's question")
     k: int = 5
     user_context: Optional[Dict[str, Any]] = None
@@ -24,11 +29,15 @@ class QueryRequest(BaseModel):
     chat_history: Optional[List[ChatMessage]] = None
 
 class QueryResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     answer: str
     sources: List[Dict[str, Any]]
     confidence: float = None
 
 class DocumentInfo(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     filename: str
     chunks: int = None
 
@@ -39,7 +48,7 @@ async def health_check():
 
 @router.get("/documents", response_model=List[str])
 async def get_documents(
-    vector_service: VectorStoreService = Depends(get_vector_service)
+    vector_service=Depends(get_vector_service)
 ):
     """Get list of ingested documents"""
     try:
@@ -48,45 +57,42 @@ async def get_documents(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get documents: {str(e)}")
 
-@router.post("/query", response_model=QueryResponse)
+# No response_model: the handler already shapes the dict, and skipping the
+# Pydantic validate+dump pass lets orjson encode it directly
+@router.post("/query")
 async def query_documents(
     request: QueryRequest,
-    rag_service: RAGService = Depends(get_rag_service),
+    rag_service=Depends(get_rag_service),
 ):
     """Query documents using RAG"""
     try:
-        # Generate answer using RAG service (includes retrieval)
-        response_data = rag_service.query(
+        # Generate answer using RAG service (includes retrieval). The whole
+        # pipeline is blocking, so run it in the threadpool to keep the
+        # event loop free for other requests during the LLM call. RAGService
+        # owns the exact and semantic caches, so repeats and paraphrases
+        # short-circuit in there with one canonical cached shape; this
+        # endpoint only adapts that result to its own response schema.
+        response_data = await run_in_threadpool(
+            rag_service.query,
             query=request.question,
             user_context=request.user_context,
             system_context=request.system_context,
-            chat_history=[msg.dict() for msg in request.chat_history] if request.chat_history else None,
+            chat_history=request.chat_history,
             max_results=request.k
         )
-        answer = response_data["response"]
-        doc_sources = response_data.get("sources", [])
-
-        # Format sources as list of dicts with content and metadata
-        sources = []
-        for src in doc_sources:
-            if isinstance(src, dict):
-                content = src.get("content", "")
-                metadata = src.get("metadata", {})
-                sources.append({"content": content, "metadata": metadata})
-            else:
-                sources.append({"content": src, "metadata": {"source": src}})
-
-        return QueryResponse(
-            answer=answer,
-            sources=sources
-        )
+        # RAGService already returns sources as {content, metadata} dicts
+        return {
+            "answer": response_data["response"],
+            "sources": response_data.get("sources", []),
+            "confidence": None,
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
 @router.post("/documents/search")
 async def search_documents(
     request: QueryRequest,
-    vector_service: VectorStoreService = Depends(get_vector_service)
+    vector_service=Depends(get_vector_service)
 ):
     """Search documents without generating an answer"""
     try:
@@ -107,18 +113,29 @@ async def search_documents(
 
 @router.post("/documents/ingest")
 async def ingest_documents(
-    vector_service: VectorStoreService = Depends(get_vector_service)
+    vector_service=Depends(get_vector_service)
 ):
     """Manually trigger document ingestion"""
     try:
-        count = vector_service.ingest_all_documents()
+        # Long ingests run in the threadpool so they don't block other requests
+        count = await run_in_threadpool(vector_service.ingest_all_documents)
         return {"message": f"Successfully ingested {count} documents", "count": count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
     
+# Readiness and the ingested-file list only change at ingest time; cache them
+# keyed on the vector store's ingest_version instead of probing per request
+_vectorstore_debug_cache = (None, None)
+
 @router.get("/debug/vectorstore")
-def check_vectorstore(vector_service: VectorStoreService = Depends(get_vector_service)):
-    return {
+def check_vectorstore(vector_service=Depends(get_vector_service)):
+    global _vectorstore_debug_cache
+    version, cached = _vectorstore_debug_cache
+    if cached is not None and version == vector_service.ingest_version:
+        return cached
+    result = {
         "is_ready": vector_service.is_ready(),
         "ingested_files": vector_service.get_ingested_files()
-    }
\ No newline at end of file
+    }
+    _vectorstore_debug_cache = (vector_service.ingest_version, result)
+    return result
\ No newline at end of file
@@ -1,14 +1,21 @@
 # app.py
+import functools
 import logging
-from fastapi import FastAPI, HTTPException, Depends, Request, Body
+import time
+from contextlib import asynccontextmanager
+import anyio
+import httpx
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Body
+from typing import Any, Dict
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from config import settings
-from models import QueryRequest, QueryResponse
+from models import QueryRequest, QueryResponse, EmbeddingBatchRequest
 from exceptions import RAGException
 from monitoring import setup_monitoring, get_tracer
 from api.auth_routes import router as auth_router
@@ -18,55 +25,179 @@ from users.models import Base
 
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI app
-app = FastAPI(title="Civic Nexus RAG API")
+# Bounds how many blocking RAG calls run in the threadpool at once so the
+# event loop stays responsive under load
+_rag_limiter = None
+
+def get_rag_limiter() -> anyio.CapacityLimiter:
+    global _rag_limiter
+    if _rag_limiter is None:
+        _rag_limiter = anyio.CapacityLimiter(settings.RAG_CONCURRENCY)
+    return _rag_limiter
+
+def get_http(request: Request) -> httpx.AsyncClient:
+    """Dependency handing out the shared outbound HTTP client"""
+    return request.app.state.http
+
+async def sse_events_async(chunks):
+    """Encode response chunks as orjson SSE frames, flushed per token"""
+    async for chunk in chunks:
+        yield b"data: " + orjson.dumps({"response": chunk}) + b"\n\n"
+    yield b"data: " + orjson.dumps({"done": True}) + b"\n\n"
+
+# Token endings that mark a natural flush point for the stream coalescers
+_FLUSH_BOUNDARIES = (" ", "\n", "\t", ".", ",", ";", ":", "!", "?")
+
+async def _buffered_stream(tokens, flush_every: int = 8):
+    """Coalesce streamed tokens into multi-token SSE chunks.
+
+    The first token flushes immediately so time-to-first-byte is unchanged;
+    after that tokens accumulate until ~flush_every arrive or one ends on a
+    whitespace/punctuation boundary. Each flush is one frame encode and one
+    TCP write instead of one per token.
+    """
+    buf = []
+    first = True
+    async for token in tokens:
+        buf.append(token)
+        if first or len(buf) >= flush_every or token.endswith(_FLUSH_BOUNDARIES):
+            yield "".join(buf)
+            buf.clear()
+            first = False
+    if buf:
+        yield "".join(buf)
+
+async def _buffered_deltas(events, flush_every: int = 8):
+    """Apply _buffered_stream coalescing to "delta" events only.
+
+    Other named events ("sources", errors) pass through unchanged, with any
+    buffered deltas flushed first so ordering is preserved.
+    """
+    buf = []
+    first = True
+    async for event, data in events:
+        if event != "delta":
+            if buf:
+                yield ("delta", "".join(buf))
+                buf.clear()
+            yield (event, data)
+            continue
+        buf.append(data)
+        if first or len(buf) >= flush_every or data.endswith(_FLUSH_BOUNDARIES):
+            yield ("delta", "".join(buf))
+            buf.clear()
+            first = False
+    if buf:
+        yield ("delta", "".join(buf))
+
+async def sse_named_events(events):
+    """Encode (event, data) pairs as named SSE frames"""
+    async for event, data in events:
+        yield b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+    yield b"event: done\ndata: {}\n\n"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize the database and (once) the heavyweight services"""
+    # Directory setup happens exactly once per worker, not per service init
+    settings.create_directories()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    logger.info("Database initialized")
+
+    # main.py pre-populates app.state when it drives startup; otherwise pull
+    # the shared lazy singletons so models load exactly once per worker
+    if getattr(app.state, "rag_service", None) is None:
+        from dependencies import get_vector_service, get_llm_service, get_rag_service
+
+        app.state.vector_service = get_vector_service()
+        app.state.llm_service = get_llm_service()
+        app.state.rag_service = get_rag_service()
+        logger.info("Services initialized in lifespan")
+
+    # One outbound HTTP pool for the whole app: endpoints (and any future
+    # remote reranker/embedding backend) share the LLM service's keep-alive
+    # client instead of each building their own pool
+    app.state.http = app.state.llm_service._get_async_client()
+
+    yield
+
+    # Drain the LLM service's pooled async connections on shutdown
+    llm_service = getattr(app.state, "llm_service", None)
+    if llm_service is not None:
+        await llm_service.aclose()
+
+# Initialize FastAPI app; orjson serializes responses (large /query payloads
+# with sources are several KB) far faster than stdlib json
+app = FastAPI(
+    title="Civic Nexus RAG API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # Add routers
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(rag_router, prefix="/api", tags=["RAG API"])
 
-# Setup rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Setup rate limiter. With REDIS_URL set, counters are shared across all
+# uvicorn workers instead of each process allowing its own full quota.
+RATE_LIMIT = f"{settings.RATE_LIMIT_REQUESTS}/{settings.RATE_LIMIT_PERIOD}"
+# No default_limits: those only apply through SlowAPIMiddleware, which
+# would also throttle /health and /metrics probes. The expensive query
+# endpoints are decorated explicitly instead.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.REDIS_URL or "memory://",
+    strategy=settings.RATE_LIMIT_STRATEGY,
+)
 app.state.limiter = limiter
 
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=429,
         content={"detail": "Rate limit exceeded. Please slow down."}
     )
 
-# Setup CORS
+# Setup CORS. Explicit methods/headers let the middleware answer
+# preflights from small precomputed sets instead of wildcard matching,
+# and the origin regex is compiled once at mount time.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
+    allow_origin_regex=settings.CORS_ORIGIN_REGEX or None,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=("GET", "POST", "DELETE", "OPTIONS"),
+    allow_headers=("authorization", "content-type"),
 )
 
 # Setup monitoring
 setup_monitoring(app)
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("Database initialized")
-
 # Your existing endpoints...
 @app.get("/")
 async def root():
     return {"message": "Civic Nexus RAG API is running"}
 
+# /health is probed every few seconds per load-balancer pod; serve a 1s
+# snapshot instead of touching the services on every probe
+_health_cache = (0.0, None)
+
 @app.get("/health")
 async def health_check(request: Request):
+    global _health_cache
+    ts, cached = _health_cache
+    if cached is not None and time.monotonic() - ts < 1.0:
+        return cached
     rag_service = request.app.state.rag_service
-    return rag_service.get_status()
+    status = rag_service.get_status()
+    _health_cache = (time.monotonic(), status)
+    return status
 
-@app.post("/query", response_model=QueryResponse)
-@limiter.limit(f"{settings.RATE_LIMIT_REQUESTS}/minute")
+# No response_model here: the dict is already in QueryResponse shape and
+# re-validating it on the way out would just burn CPU before orjson encodes it
+@app.post("/query")
+@limiter.limit(RATE_LIMIT)
 async def query(
     request: Request,
     query: QueryRequest = Body(...)
@@ -75,59 +206,115 @@ async def query(
     rag_service = request.app.state.rag_service
     try:
         with get_tracer().start_as_current_span("query_endpoint") as span:
-            span.set_attribute("query", query.question)
+            span.set_attribute("query", query.query)
             span.set_attribute("stream", query.stream)
-            
-            response = rag_service.query(
-                query=query.question,
-                user_context=query.user_context,
-                system_context=query.system_context or "",
-                chat_history=query.chat_history,
-                max_results=query.max_results,
-                stream=query.stream,
-                temperature=query.temperature,
-                max_tokens=query.max_tokens
+
+            if query.stream:
+                # Stream tokens natively on the event loop; halves
+                # time-to-first-byte for chat UIs vs buffering
+                return StreamingResponse(
+                    sse_events_async(_buffered_stream(rag_service.stream_query(
+                        query=query.query,
+                        user_context=query.user_context,
+                        system_context=query.system_context or "",
+                        chat_history=query.chat_history,
+                        max_results=query.max_results,
+                        temperature=query.temperature,
+                        max_tokens=query.max_tokens,
+                    ))),
+                    media_type="text/event-stream",
+                )
+
+            # RAGService owns the exact and semantic caches: repeats and
+            # paraphrases short-circuit inside query() before retrieval,
+            # so a second cache layer here would only store duplicates
+            response = await anyio.to_thread.run_sync(
+                functools.partial(
+                    rag_service.query,
+                    query=query.query,
+                    user_context=query.user_context,
+                    system_context=query.system_context or "",
+                    chat_history=query.chat_history,
+                    max_results=query.max_results,
+                    temperature=query.temperature,
+                    max_tokens=query.max_tokens
+                ),
+                limiter=get_rag_limiter()
             )
-            
+
             return response
     except RAGException as e:
-        logger.error(f"RAG error: {e}")
+        logger.error("RAG error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/query_with_sanity_check")
+@limiter.limit(RATE_LIMIT)
 async def query_with_sanity_check(
-    request: QueryRequest,
-    rag_service=Depends(get_rag_service)
+    request: Request,
+    query: QueryRequest = Body(...)
 ):
-    result = rag_service.query_with_sanity_check(
-        question=request.question,
-        max_results=request.max_results or 5,
-        temperature=request.temperature or 0.7,
-        max_tokens=request.max_tokens or 512,
+    rag_service = request.app.state.rag_service
+    result = await anyio.to_thread.run_sync(
+        functools.partial(
+            rag_service.query_with_sanity_check,
+            question=query.query,
+            max_results=query.max_results or 5,
+            temperature=query.temperature or 0.7,
+            max_tokens=query.max_tokens or 512,
+        ),
+        limiter=get_rag_limiter(),
     )
     return result
 
 
 @app.post("/query/stream")
+@limiter.limit(RATE_LIMIT)
 async def stream_query_documents(
-    query: QueryRequest = Body(...),
-    rag_service: RAGService = Depends(get_rag_service)
+    request: Request,
+    query: QueryRequest = Body(...)
 ):
-    response_generator = rag_service.query(
-        query=query.question,
-        user_context=query.user_context,
-        system_context=query.system_context,
-        chat_history=[msg.dict() for msg in query.chat_history] if query.chat_history else None,
-        max_results=query.k,
-        stream=True
-    )  # This returns a generator from LLMService
+    rag_service = request.app.state.rag_service
+    # Named events: sources arrive right after retrieval so clients can
+    # render them while tokens ("delta" events) are still decoding
+    return StreamingResponse(
+        sse_named_events(_buffered_deltas(rag_service.query_sse(
+            query=query.query,
+            user_context=query.user_context,
+            system_context=query.system_context or "",
+            chat_history=query.chat_history,
+            max_results=query.max_results,
+        ))),
+        media_type="text/event-stream",
+    )
 
-    return StreamingResponse(response_generator, media_type="text/event-stream")
 
 
+@app.post("/embeddings/batch")
+async def embed_batch(request: Request, batch: EmbeddingBatchRequest = Body(...)):
+    """Embed up to EMBEDDING_MAX_BATCH texts in a single forward pass.
+
+    One batched call amortizes the FastAPI/model-dispatch overhead that N
+    separate single-text requests would each pay.
+    """
+    vector_service = request.app.state.vector_service
+    try:
+        with get_tracer().start_as_current_span("embed_batch_endpoint") as span:
+            span.set_attribute("batch_size", len(batch.texts))
+            embeddings = await anyio.to_thread.run_sync(
+                functools.partial(vector_service.embeddings.embed_documents, batch.texts),
+                limiter=get_rag_limiter(),
+            )
+            return {
+                "embeddings": embeddings,
+                "dim": len(embeddings[0]) if embeddings else 0,
+                "model": settings.EMBEDDING_MODEL,
+            }
+    except Exception as e:
+        logger.error("Batch embedding error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/ingest")
 async def ingest_documents(request: Request):
@@ -135,13 +322,15 @@ async def ingest_documents(request: Request):
     rag_service = request.app.state.rag_service
     try:
         with get_tracer().start_as_current_span("ingest_documents_endpoint"):
-            count = rag_service.ingest_documents()
+            count = await anyio.to_thread.run_sync(
+                rag_service.ingest_documents, limiter=get_rag_limiter()
+            )
             return {"message": f"Successfully ingested {count} documents"}
     except RAGException as e:
-        logger.error(f"Document ingestion error: {e}")
+        logger.error("Document ingestion error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/documents")
@@ -150,10 +339,12 @@ async def get_documents(request: Request):
     vector_service = request.app.state.vector_service
     try:
         with get_tracer().start_as_current_span("get_documents_endpoint"):
-            files = vector_service.get_ingested_files()
+            files = await anyio.to_thread.run_sync(
+                vector_service.get_ingested_files, limiter=get_rag_limiter()
+            )
             return {"documents": files}
     except Exception as e:
-        logger.error(f"Error getting documents: {e}")
+        logger.error("Error getting documents: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.delete("/cache")
@@ -162,16 +353,27 @@ async def clear_cache(request: Request):
     rag_service = request.app.state.rag_service
     try:
         with get_tracer().start_as_current_span("clear_cache_endpoint"):
-            rag_service.clear_cache()
+            # clear_cache drops every tier: vector, response, prompt-context,
+            # history and semantic caches
+            await anyio.to_thread.run_sync(
+                rag_service.clear_cache, limiter=get_rag_limiter()
+            )
             return {"message": "Cache cleared successfully"}
     except Exception as e:
-        logger.error(f"Error clearing cache: {e}")
+        logger.error("Error clearing cache: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 if __name__ == "__main__":
+    import uvicorn
+    # uvloop + httptools beat the stock asyncio loop/h11 parser; the
+    # autoreloader (and its watcher thread) only runs in DEBUG
     uvicorn.run(
         "app:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
-        reload=True
+        loop="uvloop",
+        http="httptools",
+        workers=1 if settings.DEBUG else settings.UVICORN_WORKERS,
+        backlog=2048,
+        reload=settings.DEBUG
     )
\ No newline at end of file
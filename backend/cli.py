@@ -1,10 +1,11 @@
 import sys
+import time
 import logging
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from services.rag_service import RAGService
+from services.rag_service import RAGService, QueryConfig
 from exceptions import RAGException
-from services.vector_store import VectorStoreService
-from services.llm_service import LLMService
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,7 +22,14 @@ class CLI:
             "?": self._cmd_help,
         }
         self.running = True
-    
+        # Warm the embedding model in the background: the cold load happens
+        # while the user is still typing their first question instead of
+        # being paid on top of the first LLM round-trip
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._warm = self._executor.submit(
+            self.rag_service.vector_service.embeddings.embed_query, "warmup"
+        )
+
     def run(self):
         """Run the CLI interface"""
         print("🤖 Civic Nexus RAG System")
@@ -65,12 +73,38 @@ class CLI:
     
     def _handle_query(self, query: str) -> None:
         """Process a user query and print the results"""
-        print("Processing query, please wait...")
-        result = self.rag_service.query(query)
+        self._warm.result()  # no-op once the warmup pass has finished
+        # Streaming config: retrieval still runs in the executor (spinner
+        # covers it), then tokens print as they arrive instead of after the
+        # full completion
+        future = self._executor.submit(
+            self.rag_service.query, query, config=QueryConfig(stream=True)
+        )
+        spinner = itertools.cycle("|/-\\")
+        while not future.done():
+            sys.stdout.write(f"\rProcessing query {next(spinner)} ")
+            sys.stdout.flush()
+            time.sleep(0.1)
+        sys.stdout.write("\r" + " " * 30 + "\r")
+        result = future.result()
         print("\n" + "-" * 50)
-        print(f"🧠 Response:\n{result.get('response', '[No response]')}")
-        sources = result.get('sources', [])
-        print(f"\n📋 Sources: {', '.join(sources) if sources else 'None'}")
+        print("🧠 Response:")
+        response = result.get('response')
+        if isinstance(response, str) or response is None:
+            print(response or '[No response]')
+        else:
+            for token in response:
+                sys.stdout.write(token)
+                sys.stdout.flush()
+            print()
+        # Sources are {content, metadata} dicts; dedupe filenames in a single
+        # ordered pass (dict keys) instead of list(set(...)) round trips
+        seen = {
+            src.get('metadata', {}).get('source', 'unknown'): None
+            for src in result.get('sources', [])
+            if isinstance(src, dict)
+        }
+        print(f"\n📋 Sources: {', '.join(seen) if seen else 'None'}")
         print(f"Documents used: {result.get('num_sources', 0)}")
         print(f"Processing time: {result.get('processing_time', 0):.2f}s")
         print("-" * 50)
@@ -96,8 +130,8 @@ class CLI:
         print("  help/?  - Show this help message")
 
 if __name__ == "__main__":
-    vector_service = VectorStoreService()
-    llm_service = LLMService()
-    rag_service = RAGService(vector_service=vector_service, llm_service=llm_service)
-    cli = CLI(rag_service=rag_service)
+    # Shared singletons: reuses the embedding model and services if the API
+    # is started from the same process
+    from dependencies import get_rag_service
+    cli = CLI(rag_service=get_rag_service())
     cli.run()
\ No newline at end of file
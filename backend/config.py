@@ -4,41 +4,93 @@ from typing import List
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Resolved once at import instead of per Field default
+_BASE = Path(__file__).resolve().parent
+
 class Settings(BaseSettings):
     # Paths
-    BASE_DIR: Path = Path(__file__).parent
-    DOCUMENTS_PATH: Path = Field(default=Path(__file__).parent / "documents")
-    CHROMA_DB_PATH: Path = Field(default=Path(__file__).parent / "chroma_db")
-    METADATA_FILE: Path = Field(default=Path(__file__).parent / "ingested_files.json")
+    BASE_DIR: Path = _BASE
+    DOCUMENTS_PATH: Path = Field(default=_BASE / "documents")
+    CHROMA_DB_PATH: Path = Field(default=_BASE / "chroma_db")
+    METADATA_FILE: Path = Field(default=_BASE / "ingested_files.json")
     
     # Embedding model
     EMBEDDING_MODEL: str = Field(default="sentence-transformers/all-MiniLM-L6-v2")
+    # Device for the PyTorch embedding path; set to "cuda" to embed on GPU
+    EMBEDDING_DEVICE: str = Field(default="cpu")
+    # Run the embedder on ONNX Runtime with INT8 quantization instead of
+    # the PyTorch FP32 path (requires optimum[onnxruntime])
+    USE_ONNX_EMBEDDINGS: bool = Field(default=False)
     
     # RAG Settings
     CHUNK_SIZE: int = Field(default=500, ge=100, le=2000)
     CHUNK_OVERLAP: int = Field(default=100, ge=0, le=500)
     SIMILARITY_K: int = Field(default=5, ge=1, le=20)
+    # Questions marshaled into one LLM call by RAGService.query_batch;
+    # gains flatten out past a handful per call
+    ROW_MARSHAL_BATCH: int = Field(default=6, ge=1, le=32)
+    INGEST_BATCH_SIZE: int = Field(default=128, ge=1, le=2048)
+    EMBEDDING_BATCH_SIZE: int = Field(default=32, ge=1, le=256)
+    EMBEDDING_MAX_BATCH: int = Field(default=64, ge=1, le=1024)
+    USE_FAISS_INDEX: bool = Field(default=False)
+    # "auto" trains IVF+PQ (flat below the training threshold); "hnsw"
+    # builds a graph index that scales better on large corpora
+    FAISS_INDEX_KIND: str = Field(default="auto")
+    USE_BINARY_INDEX: bool = Field(default=False)
+    # Micro-batch concurrent similarity searches arriving within this
+    # window (one embedding forward pass per batch); 0 disables batching
+    # so single-user latency is unaffected by default
+    RETRIEVAL_BATCH_WINDOW_MS: int = Field(default=0, ge=0, le=100)
+    RETRIEVAL_BATCH_MAX: int = Field(default=16, ge=1, le=128)
     
     # LLM Settings
     OLLAMA_MODEL: str = Field(default="mistral")
     OLLAMA_BASE_URL: str = Field(default="http://localhost:11434")
+    # Forward retrieved-chunk ids to backends with chunk/prefix KV caching
+    FORWARD_KV_CACHE_HINTS: bool = Field(default=False)
+    # Gzip generate request bodies over 4 KiB; off by default since stock
+    # Ollama does not decode compressed request bodies
+    LLM_COMPRESS_REQUESTS: bool = Field(default=False)
     
     # API Settings
     API_HOST: str = Field(default="127.0.0.1")
     API_PORT: int = Field(default=8000, ge=1024, le=65535)
+    DEBUG: bool = Field(default=False)
+    UVICORN_WORKERS: int = Field(default_factory=lambda: 2 * (os.cpu_count() or 1))
     CORS_ORIGINS: List[str] = Field(default=["http://localhost:8081", "http://127.0.0.1:8081"])
+    # Optional precompiled origin pattern, checked after the exact-match list
+    CORS_ORIGIN_REGEX: str = Field(default="")
     
     # Cache Settings
     CACHE_SIZE: int = Field(default=1000, ge=100, le=10000)
     CACHE_TTL: int = Field(default=3600, ge=60, le=86400)
+    QUERY_CACHE_SIZE: int = Field(default=10000, ge=100, le=100000)
+    QUERY_CACHE_TTL: int = Field(default=3600, ge=60, le=86400)
+    SEMANTIC_CACHE_SIZE: int = Field(default=1000, ge=100, le=100000)
+    SEMANTIC_CACHE_THRESHOLD: float = Field(default=0.95, ge=0.5, le=1.0)
     
     # Retry Settings
     MAX_RETRIES: int = Field(default=3, ge=1, le=5)
     RETRY_BACKOFF_FACTOR: float = Field(default=0.1, ge=0.1, le=1.0)
     
+    # Concurrency
+    RAG_CONCURRENCY: int = Field(default=8, ge=1, le=64)
+
+    # Monitoring
+    # Fraction of traces recorded; spans in unsampled traces are no-ops
+    TRACE_SAMPLE_RATIO: float = Field(default=0.1, ge=0.0, le=1.0)
+    # Span prompt assembly too; off by default since the span costs a
+    # noticeable fraction of the string work it would measure
+    TRACE_PROMPT_ASSEMBLY: bool = Field(default=False)
+
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = Field(default=100, ge=10, le=1000)
     RATE_LIMIT_PERIOD: str = Field(default="minute")  # not int
+    # Shared limiter backend; empty string keeps per-process in-memory counters
+    REDIS_URL: str = Field(default="")
+    # slowapi strategy: moving-window is the most accurate; fixed-window is
+    # cheaper per request for single-worker dev setups
+    RATE_LIMIT_STRATEGY: str = Field(default="moving-window")
     
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
     
@@ -1,30 +1,31 @@
-from services.vector_store import VectorStoreService
-from services.llm_service import LLMService
-from services.rag_service import RAGService
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-# Instantiate services
-vector_service = VectorStoreService()
-llm_service = LLMService()
-rag_service = RAGService(vector_service=vector_service, llm_service=llm_service)
+if TYPE_CHECKING:
+    from services.vector_store import VectorStoreService
+    from services.llm_service import LLMService
+    from services.rag_service import RAGService
 
-# Populate app_services for dependency injection or app-wide access
-app_services = {
-    'vector_service': vector_service,
-    'llm_service': llm_service,
-    'rag_service': rag_service,
-}
+# Lazy singletons: building a VectorStoreService loads the embedding model
+# and opens Chroma, so services must be created once per process, on first
+# use — not as a side effect of importing this module. The service modules
+# themselves import the langchain/torch stack, so even their imports are
+# deferred to first call to keep worker boot fast.
 
-def get_vector_service() -> VectorStoreService:
-    if 'vector_service' not in app_services:
-        raise Exception("Vector service not initialized")
-    return app_services['vector_service']
+@lru_cache(maxsize=1)
+def get_vector_service() -> "VectorStoreService":
+    from services.vector_store import VectorStoreService
+    return VectorStoreService()
 
-def get_llm_service() -> LLMService:
-    if 'llm_service' not in app_services:
-        raise Exception("LLM service not initialized")
-    return app_services['llm_service']
+@lru_cache(maxsize=1)
+def get_llm_service() -> "LLMService":
+    from services.llm_service import LLMService
+    return LLMService()
 
-def get_rag_service() -> RAGService:
-    if 'rag_service' not in app_services:
-        raise Exception("RAG service not initialized")
-    return app_services['rag_service']
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_rag_service() -> "RAGService":
+    from services.rag_service import RAGService
+    return RAGService(
+        vector_service=get_vector_service(),
+        llm_service=get_llm_service(),
+    )
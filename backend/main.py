@@ -1,19 +1,10 @@
 # main.py
-import os
 import sys
+import asyncio
 import argparse
 import logging
 import uvicorn
-from pathlib import Path
 
-# Setup paths
-PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-if PROJECT_ROOT not in sys.path:
-    sys.path.insert(0, PROJECT_ROOT)
-
-from services.vector_store import VectorStoreService
-from services.llm_service import LLMService
-from services.rag_service import RAGService
 from config import settings
 from exceptions import RAGException
 
@@ -35,22 +26,23 @@ class ServiceManager:
         try:
             logger.info("🔧 Initializing services...")
             
+            # Use the shared lazy factories so the route dependencies get
+            # the exact same instances (no duplicate model/Chroma loads)
+            from dependencies import get_vector_service, get_llm_service, get_rag_service
+
             # Initialize Vector Store Service
             logger.info("📚 Initializing Vector Store Service...")
-            self.vector_service = VectorStoreService()
+            self.vector_service = get_vector_service()
             logger.info(f"✅ Vector Store initialized with {len(self.vector_service.get_ingested_files())} files")
-            
+
             # Initialize LLM Service
             logger.info("🤖 Initializing LLM Service...")
-            self.llm_service = LLMService()
+            self.llm_service = get_llm_service()
             logger.info("✅ LLM Service initialized")
-            
+
             # Initialize RAG Service
             logger.info("🔍 Initializing RAG Service...")
-            self.rag_service = RAGService(
-                vector_service=self.vector_service,
-                llm_service=self.llm_service
-            )
+            self.rag_service = get_rag_service()
             logger.info("✅ RAG Service initialized")
             
             self.initialized = True
@@ -102,9 +94,75 @@ def start_api():
         "app:app",
         host=settings.API_HOST,
         port=settings.API_PORT,
+        loop="uvloop",
+        http="httptools",
+        backlog=2048,
         reload=False  # Set to False when using external service initialization
     )
 
+async def _async_repl(rag_service):
+    """Minimal query REPL that shares the event loop with the API server.
+
+    input() runs in a worker thread via asyncio.to_thread and the blocking
+    RAG query is offloaded the same way, so neither stalls the reactor:
+    API requests keep streaming while the CLI waits for a prompt or an
+    embedding call.
+    """
+    print("Interactive query mode (quit/exit/q to leave)")
+    while True:
+        try:
+            query = (await asyncio.to_thread(input, "\n❓ Your question: ")).strip()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if not query:
+            continue
+        if query.lower() in ("quit", "exit", "q"):
+            break
+        try:
+            result = await asyncio.to_thread(rag_service.query, query)
+            print(f"\n💡 {result['response']}")
+        except RAGException as e:
+            print(f"❌ Query failed: {e}")
+
+async def _serve_with_repl():
+    """Run uvicorn and the REPL concurrently on one event loop"""
+    from app import app
+
+    config = uvicorn.Config(
+        app,
+        host=settings.API_HOST,
+        port=settings.API_PORT,
+        http="httptools",
+        backlog=2048,
+    )
+    server = uvicorn.Server(config)
+    server_task = asyncio.create_task(server.serve())
+    try:
+        await _async_repl(service_manager.rag_service)
+    finally:
+        server.should_exit = True
+        await server_task
+
+def start_both():
+    """Start the API server with an interactive CLI in the same process"""
+    logger.info("🚀 Starting API server with interactive CLI...")
+
+    if not service_manager.initialize_services():
+        logger.error("❌ Failed to initialize services. Exiting.")
+        sys.exit(1)
+
+    from app import app
+    app.state.vector_service = service_manager.vector_service
+    app.state.llm_service = service_manager.llm_service
+    app.state.rag_service = service_manager.rag_service
+
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    asyncio.run(_serve_with_repl())
+
 def start_cli():
     """Start the CLI interface"""
     logger.info("🚀 Starting CLI interface...")
@@ -121,7 +179,7 @@ def start_cli():
 
 def main():
     parser = argparse.ArgumentParser(description="Civic Nexus RAG System")
-    parser.add_argument("mode", choices=["api", "cli"], help="Run mode")
+    parser.add_argument("mode", choices=["api", "cli", "both"], help="Run mode")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose logging")
     
     args = parser.parse_args()
@@ -135,6 +193,8 @@ def main():
         start_api()
     elif args.mode == "cli":
         start_cli()
+    elif args.mode == "both":
+        start_both()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,8 +1,12 @@
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from config import settings
 
 class QueryRequest(BaseModel):
     """Request model for RAG queries"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     query: str = Field(..., description="The query to process")
     user_context: Optional[Dict[str, Any]] = Field(
         default=None,
@@ -41,13 +45,34 @@ class QueryRequest(BaseModel):
 
 class QueryResponse(BaseModel):
     """Response model for RAG queries"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     response: str | List[str] = Field(..., description="The generated response")
     sources: List[Dict[str, Any]] = Field(..., description="Source documents used")
     num_sources: int = Field(..., description="Number of sources used")
     processing_time: float = Field(..., description="Time taken to process the query")
 
+class EmbeddingBatchRequest(BaseModel):
+    """Request model for batched embedding"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+    texts: List[str] = Field(..., description="Texts to embed in one forward pass")
+
+    @field_validator("texts")
+    @classmethod
+    def validate_texts(cls, v):
+        if not v:
+            raise ValueError("texts must not be empty")
+        if len(v) > settings.EMBEDDING_MAX_BATCH:
+            raise ValueError(f"texts exceeds maximum batch size of {settings.EMBEDDING_MAX_BATCH}")
+        if any(not text.strip() for text in v):
+            raise ValueError("texts must not contain empty strings")
+        return v
+
 class DocumentMetadata(BaseModel):
     """Model for document metadata"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     source: str = Field(..., description="Source filename")
     file_path: str = Field(..., description="Full file path")
     file_size: int = Field(..., description="File size in bytes")
@@ -55,6 +80,8 @@ class DocumentMetadata(BaseModel):
 
 class ServiceStatus(BaseModel):
     """Model for service status"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     status: str = Field(..., description="Service status (healthy/unhealthy)")
     documents_ingested: int = Field(..., description="Number of ingested documents")
     vector_store_ready: bool = Field(..., description="Vector store status")
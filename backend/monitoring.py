@@ -2,7 +2,10 @@ import logging
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+from config import settings
 from prometheus_client import start_http_server, Counter, Histogram
 from fastapi import FastAPI
 from prometheus_client.openmetrics.exposition import generate_latest
@@ -18,8 +21,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize tracer
-trace.set_tracer_provider(TracerProvider())
+# Initialize tracer. Sampling head-based keeps the per-call span cost on
+# hot paths (query, per-token streaming) down to a cheap NonRecordingSpan
+# for the traces that aren't kept.
+trace.set_tracer_provider(TracerProvider(
+    sampler=ParentBased(TraceIdRatioBased(settings.TRACE_SAMPLE_RATIO))
+))
 tracer = trace.get_tracer(__name__)
 
 # Add OTLP exporter
@@ -44,10 +51,21 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
             'HTTP request duration in seconds',
             ['method', 'endpoint']
         )
+        # .labels() hashes and locks on every call; cache the label children
+        # so steady-state requests are a plain dict lookup + inc/observe
+        self._counter_cache = {}
+        self._duration_cache = {}
+
+    @staticmethod
+    def _endpoint(request) -> str:
+        # Use the route template (e.g. /documents/{filename}) instead of the
+        # raw path so path parameters don't grow the label set without bound
+        route = request.scope.get("route")
+        return route.path if route is not None else request.url.path
 
     async def dispatch(self, request, call_next):
         start_time = time.time()
-        
+
         try:
             response = await call_next(request)
             status_code = response.status_code
@@ -56,16 +74,25 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
             raise e
         finally:
             duration = time.time() - start_time
-            self.requests_total.labels(
-                method=request.method,
-                endpoint=request.url.path,
-                status=status_code
-            ).inc()
-            self.request_duration.labels(
-                method=request.method,
-                endpoint=request.url.path
-            ).observe(duration)
-        
+            endpoint = self._endpoint(request)
+            counter_key = (request.method, endpoint, status_code)
+            counter = self._counter_cache.get(counter_key)
+            if counter is None:
+                counter = self._counter_cache[counter_key] = self.requests_total.labels(
+                    method=request.method,
+                    endpoint=endpoint,
+                    status=status_code
+                )
+            counter.inc()
+            duration_key = (request.method, endpoint)
+            histogram = self._duration_cache.get(duration_key)
+            if histogram is None:
+                histogram = self._duration_cache[duration_key] = self.request_duration.labels(
+                    method=request.method,
+                    endpoint=endpoint
+                )
+            histogram.observe(duration)
+
         return response
 
 def setup_monitoring(app: FastAPI):
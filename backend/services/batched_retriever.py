@@ -0,0 +1,126 @@
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from config import settings
+from exceptions import VectorStoreException
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingSearch:
+    """A search waiting for the batch worker to serve it"""
+
+    __slots__ = ("query", "k", "_event", "_result", "_error")
+
+    def __init__(self, query: str, k: int):
+        self.query = query
+        self.k = k
+        self._event = threading.Event()
+        self._result = None
+        self._error: Optional[Exception] = None
+
+    def set_result(self, result) -> None:
+        self._result = result
+        self._event.set()
+
+    def set_error(self, error: Exception) -> None:
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class BatchedRetriever:
+    """Micro-batches concurrent similarity searches.
+
+    Concurrent requests each pay a full embedding forward pass even though
+    the model is far cheaper per query on small batches. Searches arriving
+    within a few-millisecond window are embedded with one embed_documents
+    call and, when the FAISS mirror is active, resolved with one batched
+    index call; results fan back out to the waiting callers. Under low
+    load a caller loses at most the collection window.
+    """
+
+    def __init__(self, vector_service, window_ms: Optional[int] = None,
+                 batch_max: Optional[int] = None):
+        self._vector_service = vector_service
+        if window_ms is None:
+            window_ms = settings.RETRIEVAL_BATCH_WINDOW_MS
+        self._window = window_ms / 1000.0
+        self._batch_max = batch_max or settings.RETRIEVAL_BATCH_MAX
+        self._queue: "queue.Queue[Optional[_PendingSearch]]" = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run, name="batched-retriever", daemon=True
+        )
+        self._worker.start()
+
+    def search(self, query: str, k: int):
+        """Queue a search and block until its batch has been served"""
+        pending = _PendingSearch(query, k)
+        self._queue.put(pending)
+        return pending.wait()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._worker.join(timeout=1.0)
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._batch_max:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._serve(batch)
+                    return
+                batch.append(item)
+            self._serve(batch)
+
+    def _serve(self, batch: List[_PendingSearch]) -> None:
+        try:
+            if len(batch) == 1:
+                # Single caller: go through the per-query embedding cache
+                vectors = [self._vector_service.embed_query(batch[0].query)]
+            else:
+                vectors = self._vector_service.embeddings.embed_documents(
+                    [p.query for p in batch]
+                )
+        except Exception as e:
+            for pending in batch:
+                pending.set_error(VectorStoreException(f"Batched embedding failed: {e}"))
+            return
+
+        faiss_store = getattr(self._vector_service, "_faiss_store", None)
+        if faiss_store is not None and len(batch) > 1:
+            try:
+                k_max = max(p.k for p in batch)
+                hit_rows = faiss_store.search_batch(vectors, k_max)
+                for pending, hits in zip(batch, hit_rows):
+                    pending.set_result([doc for doc, score in hits[:pending.k]])
+                return
+            except Exception as e:
+                logger.warning(f"Batched FAISS search failed, falling back per query: {e}")
+
+        for pending, vector in zip(batch, vectors):
+            try:
+                pending.set_result(
+                    self._vector_service.search_by_vector(vector, pending.k)
+                )
+            except Exception as e:
+                pending.set_error(VectorStoreException(f"Document search failed: {e}"))
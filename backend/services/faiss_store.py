@@ -0,0 +1,107 @@
+import logging
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from exceptions import VectorStoreException
+
+logger = logging.getLogger(__name__)
+
+class FaissStore:
+    """Approximate nearest-neighbor index over document embeddings.
+
+    With kind="auto" (default), builds a FAISS IVF+PQ index (inner product
+    over normalized embeddings, i.e. cosine) when the corpus is large
+    enough to train one, and falls back to an exact flat index for small
+    corpora. kind="hnsw" builds an HNSW graph instead: no training step,
+    better recall at the same latency, and a memory-resident structure
+    that scales past the point where IVF recall degrades. Search is a
+    single BLAS-backed batched call, so multi-query lookups cost barely
+    more than one.
+    """
+
+    def __init__(self, dim: int, nprobe: int = 8, kind: Optional[str] = None):
+        try:
+            import faiss
+        except ImportError as e:
+            raise VectorStoreException(
+                "faiss is not installed; install faiss-cpu to use the FAISS index"
+            ) from e
+        self._faiss = faiss
+        self.dim = dim
+        self.nprobe = nprobe
+        if kind is None:
+            from config import settings
+            kind = settings.FAISS_INDEX_KIND
+        self.kind = kind
+        self.index = None
+        self._payloads: List[Any] = []
+
+    @staticmethod
+    def _pq_subquantizers(dim: int) -> int:
+        """Pick the largest supported PQ segment count that divides dim"""
+        for m in (32, 16, 8, 4):
+            if dim % m == 0:
+                return m
+        return 1
+
+    def build(self, embeddings: Sequence[Sequence[float]], payloads: Sequence[Any]) -> None:
+        """(Re)build the index from embeddings and their associated payloads"""
+        faiss = self._faiss
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise VectorStoreException(
+                f"Expected embeddings of shape (n, {self.dim}), got {vectors.shape}"
+            )
+
+        n = vectors.shape[0]
+        # IVF needs roughly 39 training vectors per centroid to converge
+        nlist = min(4096, max(1, n // 39))
+        pq_m = self._pq_subquantizers(self.dim)
+
+        if self.kind == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dim, 32, faiss.METRIC_INNER_PRODUCT)
+            logger.info(f"Building HNSW index over {n} vectors")
+        elif nlist >= 16 and pq_m > 1:
+            index = faiss.index_factory(
+                self.dim, f"IVF{nlist},PQ{pq_m}", faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vectors)
+            index.nprobe = self.nprobe
+            logger.info(f"Trained IVF{nlist},PQ{pq_m} index on {n} vectors")
+        else:
+            # Too few vectors to train IVF/PQ; exact search is cheap here anyway
+            index = faiss.IndexFlatIP(self.dim)
+            logger.info(f"Using flat index for {n} vectors (corpus too small for IVF+PQ)")
+
+        index.add(vectors)
+        self.index = index
+        self._payloads = list(payloads)
+
+    def search(self, query: Sequence[float], k: int) -> List[Tuple[Any, float]]:
+        """Search for the top-k payloads closest to a single query embedding"""
+        return self.search_batch([query], k)[0]
+
+    def search_batch(
+        self, queries: Sequence[Sequence[float]], k: int
+    ) -> List[List[Tuple[Any, float]]]:
+        """Search several query embeddings in one batched index call"""
+        if self.index is None:
+            raise VectorStoreException("FAISS index not built")
+
+        q = np.ascontiguousarray(np.asarray(queries, dtype=np.float32))
+        if q.ndim == 1:
+            q = q[None, :]
+
+        distances, indices = self.index.search(q, k)
+        results = []
+        for dist_row, idx_row in zip(distances, indices):
+            results.append([
+                (self._payloads[idx], float(dist))
+                for dist, idx in zip(dist_row, idx_row)
+                if idx >= 0
+            ])
+        return results
+
+    def __len__(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
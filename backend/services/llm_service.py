@@ -1,11 +1,15 @@
+import gzip
 import requests
+import httpx
 import json
 import logging
 import time
-from typing import Generator, Dict, Any, Optional, Union
+
+import orjson
+from typing import AsyncGenerator, Generator, Dict, Any, List, Optional, Union
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from tenacity import retry, stop_after_attempt, wait_exponential
+from functools import lru_cache
 from prometheus_client import Counter, Histogram
 from opentelemetry import trace
 from contextlib import contextmanager
@@ -22,50 +26,84 @@ llm_request_duration = Histogram('llm_request_duration_seconds', 'LLM request du
 llm_errors_total = Counter('llm_errors_total', 'Total number of LLM errors')
 llm_stream_errors_total = Counter('llm_stream_errors_total', 'Total number of streaming decode errors')
 
+@lru_cache(maxsize=1)
+def _shared_session() -> requests.Session:
+    """Process-wide pooled session shared by every LLMService instance.
+
+    Keeps the keep-alive sockets to Ollama warm across instances and across
+    requests; urllib3 recycles dead connections on its own, so the session
+    is never deliberately torn down.
+    """
+    session = requests.Session()
+    retry_strategy = Retry(
+        total=settings.MAX_RETRIES,
+        backoff_factor=getattr(settings, 'RETRY_BACKOFF_FACTOR', 1),
+        status_forcelist=[500, 502, 503, 504, 429],  # Added 429 for rate limiting
+        # Never replay POSTs: generate is not idempotent and a half-consumed
+        # stream must surface to the caller, not silently restart
+        allowed_methods=frozenset(["GET", "HEAD"])
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry_strategy,
+        pool_connections=getattr(settings, 'HTTP_POOL_CONNECTIONS', 10),
+        pool_maxsize=getattr(settings, 'HTTP_POOL_MAXSIZE', 20)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    session.headers.update({
+        'Content-Type': 'application/json',
+        'User-Agent': f'QQA-RAG-Service/{getattr(settings, "VERSION", "1.0")}'
+    })
+
+    logger.info("HTTP session initialized with connection pooling")
+    return session
+
 class LLMService:
     """Handles communication with Ollama LLM with improved reliability and monitoring"""
-    
+
     def __init__(self):
         self.base_url = settings.OLLAMA_BASE_URL
         self.model = settings.OLLAMA_MODEL
         self.timeout = getattr(settings, 'LLM_TIMEOUT', 30)
         self.max_prompt_length = getattr(settings, 'MAX_PROMPT_LENGTH', 32000)
-        self.session_refresh_interval = getattr(settings, 'SESSION_REFRESH_INTERVAL', 3600)  # 1 hour
-        self._last_session_refresh = time.time()
-        self._setup_session()
-    
-    def _setup_session(self):
-        """Setup requests session with retry strategy and connection pooling"""
-        self.session = requests.Session()
-        retry_strategy = Retry(
-            total=settings.MAX_RETRIES,
-            backoff_factor=getattr(settings, 'RETRY_BACKOFF_FACTOR', 1),
-            status_forcelist=[500, 502, 503, 504, 429]  # Added 429 for rate limiting
-        )
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy,
-            pool_connections=getattr(settings, 'HTTP_POOL_CONNECTIONS', 10),
-            pool_maxsize=getattr(settings, 'HTTP_POOL_MAXSIZE', 20)
-        )
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
-        
-        # Set default headers
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'User-Agent': f'QQA-RAG-Service/{getattr(settings, "VERSION", "1.0")}'
-        })
-        
-        self._last_session_refresh = time.time()
-        logger.info("HTTP session initialized with connection pooling")
-    
-    def _refresh_session_if_needed(self):
-        """Refresh session periodically to avoid stale connections"""
-        if time.time() - self._last_session_refresh > self.session_refresh_interval:
-            logger.info("Refreshing HTTP session")
-            self.session.close()
-            self._setup_session()
-    
+        self.session = _shared_session()
+        self._async_client: Optional[httpx.AsyncClient] = None
+        # Positive availability probes are cached so generate_response
+        # doesn't pay a /api/tags round trip on every query
+        self.availability_ttl = getattr(settings, 'OLLAMA_AVAILABILITY_TTL', 30)
+        self._available_until = 0.0
+        # Model membership needs the full /api/tags payload, so it gets its
+        # own, much longer TTL: installed models rarely change at runtime
+        # Latched off for the process if the server ever rejects a
+        # compressed body with 415
+        self._gzip_requests = getattr(settings, 'LLM_COMPRESS_REQUESTS', False)
+        self.model_check_ttl = getattr(settings, 'OLLAMA_MODEL_CHECK_TTL', 300)
+        self._model_present_until = 0.0
+        self._model_present_flag = False
+        # One short-lived /api/tags fetch serves model membership, model
+        # info, the models list and health checks — readiness probes hit
+        # those every few seconds
+        self.tags_ttl = getattr(settings, 'OLLAMA_TAGS_TTL', 10)
+        self._tags_cache: Optional[tuple] = None
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Lazily create the pooled async client used by the streaming path"""
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=getattr(settings, 'HTTP_POOL_MAXSIZE', 20),
+                    max_keepalive_connections=getattr(settings, 'HTTP_POOL_CONNECTIONS', 10)
+                ),
+                headers={
+                    'Content-Type': 'application/json',
+                    'User-Agent': f'QQA-RAG-Service/{getattr(settings, "VERSION", "1.0")}'
+                }
+            )
+        return self._async_client
+
     def _validate_parameters(
         self, 
         prompt: str,
@@ -97,31 +135,97 @@ class LLMService:
             if not isinstance(top_k, int) or top_k <= 0:
                 raise ValueError("top_k must be a positive integer")
     
+    def _get_tags(self) -> Dict[str, Any]:
+        """Fetch and parse /api/tags, cached for a short TTL"""
+        now = time.monotonic()
+        if self._tags_cache is not None and now < self._tags_cache[0]:
+            return self._tags_cache[1]
+        response = self.session.get(
+            f"{self.base_url}/api/tags",
+            timeout=5
+        )
+        response.raise_for_status()
+        parsed = orjson.loads(response.content)
+        self._tags_cache = (now + self.tags_ttl, parsed)
+        return parsed
+
+    def _model_present(self) -> bool:
+        """Check the configured model is installed, at most once per TTL"""
+        if time.monotonic() < self._model_present_until:
+            return self._model_present_flag
+        models = self._get_tags().get("models", [])
+        self._model_present_flag = self.model in [m.get("name", "") for m in models]
+        self._model_present_until = time.monotonic() + self.model_check_ttl
+        return self._model_present_flag
+
     def is_available(self) -> bool:
-        """Check if Ollama is available with better error handling"""
+        """Check if Ollama is available, caching positive probes for a TTL"""
+        if time.monotonic() < self._available_until:
+            return True
         try:
             with tracer.start_as_current_span("check_ollama_availability"):
-                self._refresh_session_if_needed()
-                response = self.session.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    # Additional check: verify our model is available
-                    models = response.json().get("models", [])
-                    model_names = [model.get("name", "") for model in models]
-                    return self.model in model_names
+                # "/" is Ollama's cheap liveness endpoint; hitting /api/tags
+                # here would download and parse the whole model list
+                response = self.session.get(f"{self.base_url}/", timeout=5)
+                if response.status_code == 200 and self._model_present():
+                    self._available_until = time.monotonic() + self.availability_ttl
+                    return True
                 return False
         except requests.exceptions.Timeout:
             logger.warning("Ollama availability check timed out")
+            self._available_until = 0.0
             return False
         except requests.exceptions.ConnectionError:
             logger.warning("Cannot connect to Ollama service")
+            self._available_until = 0.0
             return False
         except Exception as e:
             logger.error(f"Ollama availability check failed: {e}")
+            self._available_until = 0.0
             return False
     
+    def _build_payload(
+        self,
+        prompt: str,
+        stream: bool,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        top_k: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        cached_chunk_ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Build the Ollama generate payload with all supported parameters"""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {}
+        }
+
+        if temperature is not None:
+            payload["options"]["temperature"] = temperature
+        if max_tokens is not None:
+            payload["options"]["num_predict"] = max_tokens  # Ollama uses num_predict
+        if top_p is not None:
+            payload["options"]["top_p"] = top_p
+        if top_k is not None:
+            payload["options"]["top_k"] = top_k
+
+        if system_prompt:
+            payload["system"] = system_prompt
+
+        # Forward prefix-cache hints for backends that support chunk-level KV
+        # reuse (e.g. vLLM with prefix caching); Ollama ignores the field
+        if cached_chunk_ids and getattr(settings, 'FORWARD_KV_CACHE_HINTS', False):
+            payload["cached_chunk_ids"] = cached_chunk_ids
+
+        # Don't serialize an empty options object on every request
+        if not payload["options"]:
+            del payload["options"]
+
+        return payload
+
     @contextmanager
     def _managed_response(self, response):
         """Context manager for proper response cleanup"""
@@ -131,10 +235,6 @@ class LLMService:
             if hasattr(response, 'close'):
                 response.close()
     
-    @retry(
-        stop=stop_after_attempt(settings.MAX_RETRIES),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
     def generate_response(
         self,
         prompt: str,
@@ -143,39 +243,23 @@ class LLMService:
         max_tokens: Optional[int] = None,
         top_p: Optional[float] = None,
         top_k: Optional[int] = None,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        cached_chunk_ids: Optional[List[str]] = None
     ) -> Union[str, Generator[str, None, None]]:
         """Generate response from LLM with comprehensive validation and monitoring"""
         
         # Validate inputs
         self._validate_parameters(prompt, temperature, max_tokens, top_p, top_k)
-        
+
         if not self.is_available():
             llm_errors_total.inc()
             raise LLMException("Ollama service is not available or model not found")
-        
-        # Build payload with all supported parameters
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": stream,
-            "options": {}
-        }
-        
-        # Add optional parameters to options
-        if temperature is not None:
-            payload["options"]["temperature"] = temperature
-        if max_tokens is not None:
-            payload["options"]["num_predict"] = max_tokens  # Ollama uses num_predict
-        if top_p is not None:
-            payload["options"]["top_p"] = top_p
-        if top_k is not None:
-            payload["options"]["top_k"] = top_k
-        
-        # Add system prompt if provided
-        if system_prompt:
-            payload["system"] = system_prompt
-        
+
+        payload = self._build_payload(
+            prompt, stream, temperature, max_tokens, top_p, top_k,
+            system_prompt, cached_chunk_ids
+        )
+
         try:
             with tracer.start_as_current_span("generate_llm_response") as span:
                 span.set_attribute("model", self.model)
@@ -184,23 +268,48 @@ class LLMService:
                 if temperature is not None:
                     span.set_attribute("temperature", temperature)
                 
-                self._refresh_session_if_needed()
                 llm_requests_total.inc()
                 
                 with llm_request_duration.time():
+                    # identity encoding on streams: gzip would buffer tokens
+                    headers = {"Accept-Encoding": "identity"} if stream else {}
+                    # Pre-serialize with orjson instead of json=: the prompt
+                    # dominates the payload and stdlib dumps is the slow part.
+                    # Content-Type is already set session-wide.
+                    body = orjson.dumps(payload)
+                    compressed = self._gzip_requests and len(body) > 4096
+                    if compressed:
+                        # level 1 is near-memcpy speed and still cuts RAG
+                        # prompts ~5x on the wire
+                        body = gzip.compress(body, compresslevel=1)
+                        headers["Content-Encoding"] = "gzip"
                     response = self.session.post(
                         f"{self.base_url}/api/generate",
-                        json=payload,
+                        data=body,
                         stream=stream,
-                        timeout=self.timeout
+                        timeout=self.timeout,
+                        headers=headers or None
                     )
+                    if compressed and response.status_code == 415:
+                        logger.warning("Server rejected gzip request body, disabling compression")
+                        self._gzip_requests = False
+                        del headers["Content-Encoding"]
+                        response = self.session.post(
+                            f"{self.base_url}/api/generate",
+                            data=orjson.dumps(payload),
+                            stream=stream,
+                            timeout=self.timeout,
+                            headers=headers or None
+                        )
                     response.raise_for_status()
                 
                 if stream:
                     return self._handle_streaming_response(response)
                 else:
                     with self._managed_response(response):
-                        result = response.json()
+                        # orjson parses the raw bytes directly, skipping
+                        # requests' charset detection + str decode
+                        result = orjson.loads(response.content)
                         return result.get("response", "")
                         
         except requests.exceptions.Timeout as e:
@@ -209,6 +318,12 @@ class LLMService:
             raise LLMException(f"Request timed out after {self.timeout} seconds")
         except requests.exceptions.ConnectionError as e:
             llm_errors_total.inc()
+            # Force the next is_available() to reprobe instead of trusting
+            # the cached positive result; the server may come back with a
+            # different model set, so re-check membership too
+            self._available_until = 0.0
+            self._model_present_until = 0.0
+            self._tags_cache = None
             logger.error(f"LLM connection error: {e}")
             raise LLMException("Failed to connect to Ollama service")
         except requests.exceptions.HTTPError as e:
@@ -230,30 +345,45 @@ class LLMService:
             raise LLMException(f"Unexpected error: {e}")
     
     def _handle_streaming_response(self, response) -> Generator[str, None, None]:
-        """Handle streaming response from Ollama with improved error handling and monitoring"""
+        """Handle streaming response from Ollama with improved error handling and monitoring.
+
+        Reads raw 4KB chunks and splits on newlines with bytes.find instead
+        of iter_lines' per-byte scanning, decoding each frame with orjson —
+        the Python-side work between tokens is what bounds stream latency.
+        """
         decode_errors = 0
         max_decode_errors = 5  # Allow some decode errors before giving up
-        
+
         try:
             with self._managed_response(response):
-                for line in response.iter_lines(decode_unicode=True):
-                    if line:
+                buffer = b""
+                done = False
+                for chunk in response.iter_content(chunk_size=4096):
+                    buffer += chunk
+                    while True:
+                        newline = buffer.find(b"\n")
+                        if newline < 0:
+                            break
+                        line, buffer = buffer[:newline], buffer[newline + 1:]
+                        if not line:
+                            continue
                         try:
-                            data = json.loads(line)
-                            if "response" in data:
-                                yield data["response"]
-                            # Check if stream is done
-                            if data.get("done", False):
-                                break
-                        except json.JSONDecodeError as e:
+                            data = orjson.loads(line)
+                        except orjson.JSONDecodeError as e:
                             decode_errors += 1
                             llm_stream_errors_total.inc()
                             logger.warning(f"Failed to decode streaming response line: {e}")
-                            
                             if decode_errors >= max_decode_errors:
                                 logger.error(f"Too many decode errors ({decode_errors}), stopping stream")
                                 raise LLMException("Too many streaming decode errors")
                             continue
+                        if "response" in data:
+                            yield data["response"]
+                        if data.get("done", False):
+                            done = True
+                            break
+                    if done:
+                        break
         except requests.exceptions.ChunkedEncodingError as e:
             logger.error(f"Chunked encoding error in streaming response: {e}")
             raise LLMException("Streaming connection interrupted")
@@ -261,18 +391,127 @@ class LLMService:
             logger.error(f"Error in streaming response: {e}")
             raise LLMException(f"Streaming response failed: {e}")
     
+    async def generate_response_async(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        top_k: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        cached_chunk_ids: Optional[List[str]] = None
+    ) -> str:
+        """Non-streaming generate awaited on the event loop.
+
+        Uses the same pooled httpx.AsyncClient as stream_response, so
+        concurrent requests multiplex over warm keep-alive connections
+        instead of each blocking an OS thread on the sync session.
+        """
+        self._validate_parameters(prompt, temperature, max_tokens, top_p, top_k)
+        payload = self._build_payload(
+            prompt, False, temperature, max_tokens, top_p, top_k,
+            system_prompt, cached_chunk_ids
+        )
+
+        client = self._get_async_client()
+        llm_requests_total.inc()
+
+        try:
+            with llm_request_duration.time():
+                response = await client.post("/api/generate", json=payload)
+                response.raise_for_status()
+            return orjson.loads(response.content).get("response", "")
+        except httpx.TimeoutException:
+            llm_errors_total.inc()
+            raise LLMException(f"Request timed out after {self.timeout} seconds")
+        except httpx.ConnectError:
+            llm_errors_total.inc()
+            self._available_until = 0.0
+            self._model_present_until = 0.0
+            raise LLMException("Failed to connect to Ollama service")
+        except httpx.HTTPStatusError as e:
+            llm_errors_total.inc()
+            if e.response.status_code == 404:
+                raise LLMException(f"Model '{self.model}' not found")
+            raise LLMException(f"HTTP error {e.response.status_code}: {e}")
+        except orjson.JSONDecodeError:
+            llm_errors_total.inc()
+            raise LLMException("Invalid response format from LLM service")
+        except httpx.HTTPError as e:
+            llm_errors_total.inc()
+            raise LLMException(f"Request failed: {e}")
+
+    async def stream_response(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        top_k: Optional[int] = None,
+        system_prompt: Optional[str] = None,
+        cached_chunk_ids: Optional[List[str]] = None
+    ) -> AsyncGenerator[str, None]:
+        """Stream tokens from Ollama natively on the event loop.
+
+        Unlike generate_response(stream=True), this awaits the HTTP call via
+        the pooled httpx.AsyncClient, so Starlette iterates chunks with
+        __anext__ instead of hopping to the threadpool per token.
+        """
+        self._validate_parameters(prompt, temperature, max_tokens, top_p, top_k)
+        payload = self._build_payload(
+            prompt, True, temperature, max_tokens, top_p, top_k,
+            system_prompt, cached_chunk_ids
+        )
+
+        client = self._get_async_client()
+        llm_requests_total.inc()
+        decode_errors = 0
+        max_decode_errors = 5
+
+        try:
+            async with client.stream(
+                "POST", "/api/generate", json=payload,
+                headers={"Accept-Encoding": "identity"}
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = orjson.loads(line)
+                    except orjson.JSONDecodeError as e:
+                        decode_errors += 1
+                        llm_stream_errors_total.inc()
+                        logger.warning(f"Failed to decode streaming response line: {e}")
+                        if decode_errors >= max_decode_errors:
+                            raise LLMException("Too many streaming decode errors")
+                        continue
+                    if "response" in data:
+                        yield data["response"]
+                    if data.get("done", False):
+                        break
+        except httpx.TimeoutException:
+            llm_errors_total.inc()
+            raise LLMException(f"Request timed out after {self.timeout} seconds")
+        except httpx.HTTPStatusError as e:
+            llm_errors_total.inc()
+            if e.response.status_code == 404:
+                raise LLMException(f"Model '{self.model}' not found")
+            raise LLMException(f"HTTP error {e.response.status_code}: {e}")
+        except httpx.HTTPError as e:
+            llm_errors_total.inc()
+            raise LLMException(f"Streaming response failed: {e}")
+
+    async def aclose(self):
+        """Close the pooled async client"""
+        if self._async_client is not None and not self._async_client.is_closed:
+            await self._async_client.aclose()
+
     def get_model_info(self) -> Dict[str, Any]:
         """Get comprehensive information about the current model"""
         try:
             with tracer.start_as_current_span("get_model_info"):
-                self._refresh_session_if_needed()
-                response = self.session.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=10
-                )
-                response.raise_for_status()
-                
-                models = response.json().get("models", [])
+                models = self._get_tags().get("models", [])
                 model_info = next((m for m in models if m["name"] == self.model), {})
                 
                 if model_info:
@@ -293,12 +532,7 @@ class LLMService:
     def get_available_models(self) -> List[str]:
         """Get list of all available models"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/api/tags",
-                timeout=10
-            )
-            response.raise_for_status()
-            models = response.json().get("models", [])
+            models = self._get_tags().get("models", [])
             return [model.get("name", "") for model in models if model.get("name")]
         except Exception as e:
             logger.error(f"Failed to get available models: {e}")
@@ -338,7 +572,9 @@ class LLMService:
         return health_status
     
     def close(self):
-        """Clean up resources"""
-        if hasattr(self, 'session'):
-            self.session.close()
-            logger.info("LLM service session closed")
\ No newline at end of file
+        """Clean up resources.
+
+        The pooled session is process-wide and intentionally left open so
+        other instances keep their warm connections.
+        """
+        logger.info("LLM service closed")
\ No newline at end of file
@@ -0,0 +1,123 @@
+import logging
+import tempfile
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from config import settings
+from exceptions import VectorStoreException
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxEmbeddings(Embeddings):
+    """MiniLM-class embeddings on ONNX Runtime with dynamic INT8 quantization.
+
+    Drop-in replacement for HuggingFaceEmbeddings (same embed_documents /
+    embed_query contract, mean pooling + L2 normalization) that skips the
+    PyTorch FP32 path. On AVX-512 VNNI hosts the quantized MatMuls run on
+    int8 dot-product instructions for roughly 4x the FP32 throughput.
+    Enabled via settings.USE_ONNX_EMBEDDINGS.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, quantize: bool = True,
+                 max_length: int = 256, token_budget: int = 8192):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise VectorStoreException(
+                "optimum[onnxruntime] is required when USE_ONNX_EMBEDDINGS is enabled"
+            ) from e
+        import numpy as np
+
+        self._np = np
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.max_length = max_length
+        self.token_budget = token_budget
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+
+        model = ORTModelForFeatureExtraction.from_pretrained(
+            self.model_name, export=True, provider="CPUExecutionProvider"
+        )
+        if quantize:
+            model = self._quantize(model)
+        self.model = model
+        logger.info(f"ONNX embeddings initialized for {self.model_name} (quantize={quantize})")
+
+    def _quantize(self, model):
+        """Quantize to dynamic INT8; fall back to the FP32 graph on failure"""
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+            quantizer = ORTQuantizer.from_pretrained(model)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            save_dir = tempfile.mkdtemp(prefix="onnx_quantized_")
+            quantizer.quantize(save_dir=save_dir, quantization_config=qconfig)
+            return ORTModelForFeatureExtraction.from_pretrained(
+                save_dir, provider="CPUExecutionProvider"
+            )
+        except Exception as e:
+            logger.warning(f"INT8 quantization failed, using FP32 ONNX model: {e}")
+            return model
+
+    def _forward(self, features):
+        """Run ORT inference on padded features, mean-pool and L2-normalize"""
+        np = self._np
+        hidden = self.model(**features).last_hidden_state
+        mask = features["attention_mask"][..., None].astype(hidden.dtype)
+        vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+    def _encode(self, texts: List[str]):
+        features = self.tokenizer(
+            texts, padding=True, truncation=True,
+            max_length=self.max_length, return_tensors="np"
+        )
+        return self._forward(features)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Tokenize once, batch by token budget, unsort.
+
+        A single tokenizer call over all texts avoids N per-call setup hits;
+        sorting the token lists by length and packing them into fixed
+        token-budget batches keeps padding waste near zero, since every
+        sequence in a batch is about the same length.
+        """
+        encoded = self.tokenizer(
+            texts, padding=False, truncation=True, max_length=self.max_length
+        )
+        input_ids = encoded["input_ids"]
+        attention_masks = encoded["attention_mask"]
+        order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]), reverse=True)
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run_batch(indices: List[int]):
+            features = self.tokenizer.pad(
+                {
+                    "input_ids": [input_ids[i] for i in indices],
+                    "attention_mask": [attention_masks[i] for i in indices],
+                },
+                return_tensors="np",
+            )
+            for i, vector in zip(indices, self._forward(features).tolist()):
+                results[i] = vector
+
+        batch: List[int] = []
+        batch_max = 0
+        for i in order:
+            length = len(input_ids[i])
+            if batch and max(batch_max, length) * (len(batch) + 1) > self.token_budget:
+                run_batch(batch)
+                batch, batch_max = [], 0
+            batch.append(i)
+            batch_max = max(batch_max, length)
+        if batch:
+            run_batch(batch)
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
@@ -1,16 +1,25 @@
 import time
+import hashlib
 import logging
 import asyncio
-from typing import Dict, Any, List, Optional, Union, Protocol, Generator
+import threading
+import functools
+import anyio
+import orjson
+from cachetools import TTLCache
+from collections import OrderedDict
+from typing import Dict, Any, AsyncGenerator, List, Optional, Union, Protocol, Generator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import Retrying, stop_after_attempt, wait_exponential
 from prometheus_client import Counter, Histogram, Gauge
 from opentelemetry import trace
 from contextlib import contextmanager
 
 from services.vector_store import VectorStoreService
 from services.llm_service import LLMService
+from services.semantic_cache import semantic_cache
 from models import QueryResponse
 from exceptions import RAGException, VectorStoreException, LLMException
 from config import settings
@@ -25,6 +34,7 @@ rag_errors_total = Counter('rag_errors_total', 'Total number of RAG errors', ['e
 rag_context_length = Histogram('rag_context_length_chars', 'Length of retrieved context in characters')
 rag_prompt_length = Histogram('rag_prompt_length_chars', 'Length of generated prompt in characters')
 rag_active_queries = Gauge('rag_active_queries', 'Number of currently active RAG queries')
+rag_context_bytes_saved = Counter('rag_context_bytes_saved_total', 'Context bytes dropped by retrieval dedup')
 
 class QueryType(Enum):
     """Enumeration of query types for metrics and monitoring"""
@@ -79,19 +89,51 @@ class RAGService:
         self.vector_service = vector_service
         self.llm_service = llm_service
         self.vector_store: VectorStoreProtocol = self.vector_service.get_vector_store()
-        
+
+        # Resolve the duck-typed store probes once instead of re-running
+        # hasattr/callable chains on every readiness or status check
+        self._is_ready_call = self._resolve_readiness_probe(self.vector_store)
+        self._get_ingested_files_fn = getattr(self.vector_store, "get_ingested_files", None)
+
+
         # Configuration
         self.max_prompt_length = getattr(settings, 'MAX_PROMPT_LENGTH', 32000)
         self.max_context_length = getattr(settings, 'MAX_CONTEXT_LENGTH', 16000)
         self.default_system_prompt = getattr(settings, 'DEFAULT_SYSTEM_PROMPT', 
             "You are a helpful assistant. Answer questions based on the provided context. "
             "If you cannot find the answer in the context, say so clearly.")
-        
+        # Precomputed common-case section: most queries run with the default
+        # system prompt, so they skip its sanitize regex and reformat
+        self._default_system_section = f"System: {self._sanitize_input(self.default_system_prompt)}"
+
         # Cache for frequently used data
         self._status_cache = {}
         self._status_cache_ttl = 30  # seconds
         self._last_status_check = 0
-        
+
+        # Service-level response cache: repeat queries skip retrieval and
+        # generation entirely, even for callers (CLI) that bypass the API
+        # layer's caches. Streaming responses are never cached.
+        self._response_cache = TTLCache(maxsize=settings.CACHE_SIZE, ttl=settings.CACHE_TTL)
+        # TTLCache mutates internal state on reads (expiry sweep), and this
+        # one is shared across threadpool workers and the CLI thread
+        self._response_cache_lock = threading.Lock()
+
+        # Per-session formatted chat history: only new messages are
+        # formatted on each turn instead of the whole conversation
+        self._history_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._history_cache_max = 256
+        # Same concurrency story as _response_cache: threadpool workers can
+        # hit the same session concurrently, and the get/insert/evict cycle
+        # must not interleave
+        self._history_cache_lock = threading.Lock()
+
+        # Small pool for overlapping independent IO: the Ollama availability
+        # probe with retrieval on the query path, and the component fan-out
+        # in get_status
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag")
+
+
         logger.info("RAG Service initialized")
 
     def _validate_query_input(self, query: str, config: QueryConfig) -> None:
@@ -127,30 +169,41 @@ class RAGService:
         text = re.sub(r'\n{3,}', '\n\n', text)
         return text.strip()
 
+    @staticmethod
+    def _resolve_readiness_probe(store: Any):
+        """Pick the readiness probe for a store once, at construction.
+
+        Returns a zero-argument callable; vector_store_is_ready then pays a
+        single attribute load per call instead of the hasattr/callable
+        dispatch chain.
+        """
+        # Try the protocol method first
+        is_ready = getattr(store, "is_ready", None)
+        if callable(is_ready):
+            return is_ready
+
+        # Fallback to collections check
+        if hasattr(store, "collections"):
+            collections = store.collections
+            if callable(collections):
+                return lambda: collections() is not None
+            return lambda: store.collections is not None
+
+        # Last resort - probing get_stats proves the store responds
+        get_stats = getattr(store, "get_stats", None)
+        if callable(get_stats):
+            def _probe() -> bool:
+                get_stats()
+                return True
+            return _probe
+
+        return lambda: False
+
     def vector_store_is_ready(self) -> bool:
         """Enhanced vector store readiness check"""
         try:
             with tracer.start_as_current_span("vector_store_readiness_check"):
-                # Try the protocol method first
-                if hasattr(self.vector_store, 'is_ready') and callable(self.vector_store.is_ready):
-                    return self.vector_store.is_ready()
-                
-                # Fallback to collections check
-                if hasattr(self.vector_store, "collections"):
-                    collections = None
-                    if callable(self.vector_store.collections):
-                        collections = self.vector_store.collections()
-                    else:
-                        collections = self.vector_store.collections
-                    return collections is not None
-                
-                # Last resort - try to get stats
-                if hasattr(self.vector_store, "get_stats"):
-                    self.vector_store.get_stats()
-                    return True
-                
-                return False
-                
+                return bool(self._is_ready_call())
         except Exception as e:
             logger.warning(f"Vector store readiness check failed: {e}")
             return False
@@ -173,28 +226,65 @@ class RAGService:
             duration = time.time() - start_time
             rag_query_duration.labels(query_type=query_type.value).observe(duration)
 
-    @retry(
-        stop=stop_after_attempt(settings.MAX_RETRIES),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
     def query(
         self,
         query: str,
         user_context: Optional[Dict[str, Any]] = None,
         system_context: Optional[str] = None,
         chat_history: Optional[List[Dict[str, str]]] = None,
-        config: Optional[QueryConfig] = None
+        config: Optional[QueryConfig] = None,
+        max_results: int = 5,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
     ) -> Dict[str, Any]:
         """Enhanced query processing with comprehensive monitoring and validation"""
-        
-        # Set defaults
+
+        # Set defaults; callers may pass either a full QueryConfig or the
+        # common knobs as flat keyword arguments
         if config is None:
-            config = QueryConfig()
+            config = QueryConfig(
+                max_results=max_results,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
         
         # Validate inputs
         self._validate_query_input(query, config)
         query = self._sanitize_input(query)
-        
+
+        cache_key = None
+        query_embedding = None
+        if not config.stream:
+            cache_key = hashlib.blake2b(
+                orjson.dumps(
+                    [query, system_context, user_context or {}, chat_history or [],
+                     config.max_results, config.temperature, config.max_tokens],
+                    option=orjson.OPT_SORT_KEYS,
+                ),
+                digest_size=16,
+            ).digest()
+            with self._response_cache_lock:
+                cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            # Near-duplicate queries hit the shared semantic cache before
+            # paying retrieval + generation; the embedding is lru-cached,
+            # so a miss here warms the vector retrieval below for free.
+            # The semantic tier keys only on the question embedding, so
+            # history-conditioned turns bypass it in both directions: a
+            # mid-conversation answer must not leak into history-free
+            # repeats, nor be served from another conversation's context.
+            if not chat_history:
+                try:
+                    query_embedding = self.vector_service.embed_query(query)
+                    semantic_hit = semantic_cache.lookup(query_embedding)
+                    if semantic_hit is not None:
+                        return semantic_hit
+                except Exception as e:
+                    logger.warning(f"Semantic cache lookup failed: {e}")
+                    query_embedding = None
+
         query_type = QueryType.STREAMING if config.stream else QueryType.STANDARD
         
         with self._query_context(query_type):
@@ -208,11 +298,20 @@ class RAGService:
                 start_time = time.time()
                 
                 try:
-                    # Step 1: Retrieve context
+                    # Step 1: Retrieve context, with the Ollama availability
+                    # probe running concurrently — wall time is
+                    # max(retrieval, probe) rather than their sum, and
+                    # generate_response's own check hits the warm TTL cache
+                    available_future = self._executor.submit(self.llm_service.is_available)
                     retrieval_start = time.time()
                     context_sections = self._retrieve_context(query, config)
                     metrics.retrieval_time = time.time() - retrieval_start
-                    metrics.context_length = len(context_sections.get("retrieved_docs", ""))
+
+                    if not available_future.result():
+                        raise LLMException("Ollama service is not available or model not found")
+                    metrics.context_length = sum(
+                        len(chunk) for chunk in context_sections.get("retrieved_chunks", [])
+                    )
                     metrics.num_sources = len(context_sections.get("sources", []))
                     
                     # Record context metrics
@@ -230,9 +329,15 @@ class RAGService:
                     metrics.prompt_length = len(prompt)
                     rag_prompt_length.observe(metrics.prompt_length)
                     
-                    # Step 3: Generate response
+                    # Step 3: Generate response, hinting the backend about
+                    # which retrieved chunks it may already have KV caches for
+                    chunk_ids = [
+                        src.get("metadata", {}).get("chunk_id")
+                        for src in context_sections.get("sources", [])
+                        if isinstance(src, dict) and src.get("metadata", {}).get("chunk_id")
+                    ]
                     generation_start = time.time()
-                    response = self._generate_response(prompt, config)
+                    response = self._generate_response(prompt, config, cached_chunk_ids=chunk_ids)
                     metrics.generation_time = time.time() - generation_start
                     
                     metrics.total_time = time.time() - start_time
@@ -253,7 +358,13 @@ class RAGService:
                             "context_length": metrics.context_length,
                             "query_type": query_type.value
                         }
-                    
+
+                    if cache_key is not None:
+                        with self._response_cache_lock:
+                            self._response_cache[cache_key] = result
+                        if query_embedding is not None:
+                            semantic_cache.insert(query_embedding, result)
+
                     return result
                     
                 except VectorStoreException as e:
@@ -266,15 +377,184 @@ class RAGService:
                     logger.error(f"Unexpected error in query: {e}")
                     raise RAGException(f"Query processing failed: {e}")
 
+    async def aquery(
+        self,
+        query: str,
+        user_context: Optional[Dict[str, Any]] = None,
+        system_context: Optional[str] = None,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        max_results: int = 5,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Async non-streaming query.
+
+        Retrieval and the question-independent prompt prefix are built
+        concurrently (both are independent; retrieval is IO-bound), then
+        generation is awaited on the pooled async client — no OS thread is
+        held for the duration of the LLM call.
+        """
+        config = QueryConfig(
+            max_results=max_results,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        self._validate_query_input(query, config)
+        query = self._sanitize_input(query)
+
+        cache_key = hashlib.blake2b(
+            orjson.dumps(
+                [query, system_context, user_context or {}, chat_history or [],
+                 config.max_results, config.temperature, config.max_tokens],
+                option=orjson.OPT_SORT_KEYS,
+            ),
+            digest_size=16,
+        ).digest()
+        with self._response_cache_lock:
+            cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self._query_context(QueryType.STANDARD):
+            start_time = time.time()
+
+            context_sections, prefix_sections = await asyncio.gather(
+                asyncio.to_thread(self._retrieve_context, query, config),
+                asyncio.to_thread(
+                    self._build_prefix_sections,
+                    system_context or self.default_system_prompt,
+                    user_context or {},
+                    chat_history or []
+                ),
+            )
+
+            prompt = self._build_prompt(
+                retrieved_docs=context_sections.get("retrieved_docs", ""),
+                system_context=system_context or self.default_system_prompt,
+                user_context=user_context or {},
+                chat_history=chat_history or [],
+                question=query,
+                prefix_sections=prefix_sections,
+            )
+
+            chunk_ids = [
+                src.get("metadata", {}).get("chunk_id")
+                for src in context_sections.get("sources", [])
+                if isinstance(src, dict) and src.get("metadata", {}).get("chunk_id")
+            ]
+
+            response = await self.llm_service.generate_response_async(
+                prompt,
+                temperature=config.temperature,
+                max_tokens=config.max_tokens,
+                cached_chunk_ids=chunk_ids
+            )
+
+            sources = context_sections.get("sources", [])
+            result = {
+                "response": response,
+                "sources": sources,
+                "num_sources": len(sources),
+                "processing_time": time.time() - start_time,
+            }
+            with self._response_cache_lock:
+                self._response_cache[cache_key] = result
+            return result
+
+    async def stream_query(
+        self,
+        query: str,
+        user_context: Optional[Dict[str, Any]] = None,
+        system_context: Optional[str] = None,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        max_results: int = 5,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncGenerator[str, None]:
+        """Async streaming query yielding response tokens only"""
+        events = self.query_sse(
+            query,
+            user_context=user_context,
+            system_context=system_context,
+            chat_history=chat_history,
+            max_results=max_results,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        async for event, data in events:
+            if event == "delta":
+                yield data
+
+    async def query_sse(
+        self,
+        query: str,
+        user_context: Optional[Dict[str, Any]] = None,
+        system_context: Optional[str] = None,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        max_results: int = 5,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncGenerator[tuple, None]:
+        """Async streaming query as (event, data) pairs.
+
+        Sources are emitted first — as soon as retrieval finishes — so a
+        client can render them after ~retrieval time instead of waiting out
+        the full decode; response tokens follow as "delta" events.
+        Retrieval and prompt building run in the threadpool (they are
+        blocking), then tokens are streamed natively from the LLM on the
+        event loop — no per-token thread hop.
+        """
+        config = QueryConfig(
+            max_results=max_results,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        self._validate_query_input(query, config)
+        query = self._sanitize_input(query)
+
+        with self._query_context(QueryType.STREAMING):
+            context_sections = await anyio.to_thread.run_sync(
+                functools.partial(self._retrieve_context, query, config)
+            )
+            yield "sources", context_sections.get("sources", [])
+
+            prompt = await anyio.to_thread.run_sync(
+                functools.partial(
+                    self._build_prompt,
+                    retrieved_docs=context_sections.get("retrieved_docs", ""),
+                    system_context=system_context or self.default_system_prompt,
+                    user_context=user_context or {},
+                    chat_history=chat_history or [],
+                    question=query,
+                )
+            )
+
+            chunk_ids = [
+                src.get("metadata", {}).get("chunk_id")
+                for src in context_sections.get("sources", [])
+                if isinstance(src, dict) and src.get("metadata", {}).get("chunk_id")
+            ]
+
+            async for chunk in self.llm_service.stream_response(
+                prompt,
+                temperature=config.temperature,
+                max_tokens=config.max_tokens,
+                cached_chunk_ids=chunk_ids
+            ):
+                yield "delta", chunk
+
     def _retrieve_context(self, query: str, config: QueryConfig) -> Dict[str, Any]:
         """Retrieve context with enhanced error handling"""
         try:
             with tracer.start_as_current_span("retrieve_context"):
                 context_sections = self.vector_service.get_context_sections(
-                    query, 
+                    query,
                     k=config.max_results
                 )
-                
+
+                self._dedup_context(context_sections)
+
                 # Apply score threshold if specified
                 if config.min_score_threshold is not None and "scores" in context_sections:
                     filtered_docs = []
@@ -289,7 +569,8 @@ class RAGService:
                                 filtered_sources.append(context_sections["sources"][i])
                             filtered_scores.append(score)
                     
-                    context_sections["retrieved_docs"] = "\n\n".join(filtered_docs)
+                    context_sections["retrieved_docs"] = filtered_docs
+                    context_sections["retrieved_chunks"] = filtered_docs
                     context_sections["sources"] = filtered_sources
                     context_sections["scores"] = filtered_scores
                 
@@ -299,26 +580,80 @@ class RAGService:
             logger.error(f"Context retrieval failed: {e}")
             raise VectorStoreException(f"Failed to retrieve context: {e}")
 
-    def _generate_response(self, prompt: str, config: QueryConfig) -> Union[str, Generator[str, None, None]]:
+    @staticmethod
+    def _dedup_context(context_sections: Dict[str, Any]) -> None:
+        """Drop repeated chunks from a retrieval result, in place.
+
+        Collections ingested before content-hash chunk ids can hold the
+        same chunk several times, and every duplicate inflates prompt
+        prefill linearly. Order is kept stable so the context prefix stays
+        cacheable by the backend.
+        """
+        sources = context_sections.get("sources", [])
+        seen = set()
+        keep = []
+        saved = 0
+        for i, src in enumerate(sources):
+            content = src.get("content", "")
+            fingerprint = hashlib.blake2b(content.encode(), digest_size=8).digest()
+            if fingerprint in seen:
+                saved += len(content)
+                continue
+            seen.add(fingerprint)
+            keep.append(i)
+
+        if len(keep) == len(sources):
+            return
+
+        rag_context_bytes_saved.inc(saved)
+        context_sections["sources"] = [sources[i] for i in keep]
+        chunks = [context_sections["sources"][j].get("content", "") for j in range(len(keep))]
+        context_sections["retrieved_chunks"] = chunks
+        context_sections["retrieved_docs"] = chunks
+        if "scores" in context_sections:
+            scores = context_sections["scores"]
+            context_sections["scores"] = [scores[i] for i in keep if i < len(scores)]
+
+    def _generate_response(
+        self,
+        prompt: str,
+        config: QueryConfig,
+        cached_chunk_ids: Optional[List[str]] = None
+    ) -> Union[str, Generator[str, None, None]]:
         """Generate response with enhanced error handling"""
         try:
             with tracer.start_as_current_span("generate_response"):
                 if config.stream:
-                    return self._create_streaming_response(prompt, config)
-                else:
-                    return self.llm_service.generate_response(
-                        prompt,
-                        stream=False,
-                        temperature=config.temperature,
-                        max_tokens=config.max_tokens,
-                        top_p=config.top_p,
-                        top_k=config.top_k
-                    )
+                    return self._create_streaming_response(prompt, config, cached_chunk_ids)
+
+                # Retries wrap only the LLM call: retrieval and prompt
+                # assembly are already done and need not be repeated on a
+                # transient generation failure
+                for attempt in Retrying(
+                    stop=stop_after_attempt(settings.MAX_RETRIES),
+                    wait=wait_exponential(multiplier=1, min=4, max=10),
+                    reraise=True,
+                ):
+                    with attempt:
+                        return self.llm_service.generate_response(
+                            prompt,
+                            stream=False,
+                            temperature=config.temperature,
+                            max_tokens=config.max_tokens,
+                            top_p=config.top_p,
+                            top_k=config.top_k,
+                            cached_chunk_ids=cached_chunk_ids
+                        )
         except Exception as e:
             logger.error(f"Response generation failed: {e}")
             raise LLMException(f"Failed to generate response: {e}")
 
-    def _create_streaming_response(self, prompt: str, config: QueryConfig) -> Generator[str, None, None]:
+    def _create_streaming_response(
+        self,
+        prompt: str,
+        config: QueryConfig,
+        cached_chunk_ids: Optional[List[str]] = None
+    ) -> Generator[str, None, None]:
         """Create a managed streaming response"""
         try:
             response_generator = self.llm_service.generate_response(
@@ -327,7 +662,8 @@ class RAGService:
                 temperature=config.temperature,
                 max_tokens=config.max_tokens,
                 top_p=config.top_p,
-                top_k=config.top_k
+                top_k=config.top_k,
+                cached_chunk_ids=cached_chunk_ids
             )
             
             for chunk in response_generator:
@@ -337,72 +673,169 @@ class RAGService:
             logger.error(f"Streaming response failed: {e}")
             raise LLMException(f"Streaming response failed: {e}")
 
+    def _build_prefix_sections(
+        self,
+        system_context: str,
+        user_context: Dict[str, Any],
+        chat_history: List[Dict[str, str]]
+    ) -> List[str]:
+        """Build the question-independent prompt sections"""
+        sections = []
+
+        if system_context == self.default_system_prompt:
+            sections.append(self._default_system_section)
+        else:
+            system_context = self._sanitize_input(system_context)
+            if system_context:
+                sections.append(f"System: {system_context}")
+
+        if user_context:
+            user_context_str = self._format_user_context(user_context)
+            if user_context_str:
+                sections.append(f"User Profile: {user_context_str}")
+
+        if chat_history:
+            session_id = user_context.get("session_id") if isinstance(user_context, dict) else None
+            history_str = self._format_chat_history_cached(session_id, chat_history)
+            if history_str:
+                sections.append(f"Chat History:\n{history_str}")
+
+        return sections
+
+    def _format_chat_history_cached(
+        self, session_id: Optional[str], chat_history: List[Dict[str, str]]
+    ) -> str:
+        """Format chat history, incrementally per session.
+
+        Re-stringifying every prior message each turn is quadratic over a
+        conversation; when user_context carries a session_id, only the
+        messages added since the last turn are formatted and appended to
+        the cached lines. Sessions evict LRU past a small bound.
+        """
+        if not session_id:
+            return self._format_chat_history(chat_history)
+
+        with self._history_cache_lock:
+            cached = self._history_cache.get(session_id)
+        if cached is not None and cached[0] <= len(chat_history):
+            seen, lines = cached
+            new_messages = chat_history[seen:]
+        else:
+            seen, lines = 0, []
+            new_messages = chat_history
+
+        # Formatting runs outside the lock on this request's own snapshot;
+        # each writer stores a self-consistent (seen, lines) tuple
+        if new_messages:
+            lines = lines + self._format_messages(new_messages)
+            # Only the window _format_chat_history uses is ever joined
+            lines = lines[-10:]
+
+        with self._history_cache_lock:
+            self._history_cache[session_id] = (len(chat_history), lines)
+            self._history_cache.move_to_end(session_id)
+            while len(self._history_cache) > self._history_cache_max:
+                self._history_cache.popitem(last=False)
+
+        return "\n".join(lines)
+
     def _build_prompt(
         self,
-        retrieved_docs: str,
+        retrieved_docs: Union[str, List[str]],
         system_context: str,
         user_context: Dict[str, Any],
         chat_history: List[Dict[str, str]],
-        question: str
+        question: str,
+        prefix_sections: Optional[List[str]] = None
     ) -> str:
-        """Enhanced prompt building with better formatting and validation"""
+        """Enhanced prompt building with better formatting and validation.
+
+        Span creation costs several µs against the dozens of µs of string
+        work here and runs on every query, so tracing is off unless
+        TRACE_PROMPT_ASSEMBLY is set.
+        """
         try:
-            with tracer.start_as_current_span("build_prompt") as span:
-                # Sanitize all inputs
-                system_context = self._sanitize_input(system_context)
-                retrieved_docs = self._sanitize_input(retrieved_docs)
-                question = self._sanitize_input(question)
-                
-                # Truncate context if too long
-                if len(retrieved_docs) > self.max_context_length:
-                    retrieved_docs = retrieved_docs[:self.max_context_length] + "...[truncated]"
-                    logger.warning(f"Context truncated to {self.max_context_length} characters")
-                
-                # Build sections
-                sections = []
-                
-                if system_context:
-                    sections.append(f"System: {system_context}")
-                
-                if user_context:
-                    user_context_str = self._format_user_context(user_context)
-                    if user_context_str:
-                        sections.append(f"User Profile: {user_context_str}")
-                
-                if chat_history:
-                    history_str = self._format_chat_history(chat_history)
-                    if history_str:
-                        sections.append(f"Chat History:\n{history_str}")
-                
-                if retrieved_docs:
-                    sections.append(f"Relevant Documents:\n{retrieved_docs}")
-                
-                sections.append(f"Question: {question}")
-                sections.append("Answer:")
-                
-                prompt = "\n\n".join(sections)
-                
-                # Validate prompt length
-                if len(prompt) > self.max_prompt_length:
-                    logger.warning(f"Prompt length ({len(prompt)}) exceeds maximum ({self.max_prompt_length})")
-                    # Truncate retrieved docs to fit
-                    excess = len(prompt) - self.max_prompt_length
-                    if len(retrieved_docs) > excess:
-                        retrieved_docs = retrieved_docs[:len(retrieved_docs) - excess - 100] + "...[truncated]"
-                        # Rebuild prompt
-                        sections = [s for s in sections if not s.startswith("Relevant Documents:")]
-                        sections.insert(-2, f"Relevant Documents:\n{retrieved_docs}")
-                        prompt = "\n\n".join(sections)
-                
-                span.set_attribute("prompt_length", len(prompt))
-                span.set_attribute("context_length", len(retrieved_docs))
-                
-                return prompt
-                
+            if settings.TRACE_PROMPT_ASSEMBLY:
+                with tracer.start_as_current_span("build_prompt") as span:
+                    prompt = self._assemble_prompt(
+                        retrieved_docs, system_context, user_context,
+                        chat_history, question, prefix_sections
+                    )
+                    span.set_attribute("prompt_length", len(prompt))
+                    return prompt
+            return self._assemble_prompt(
+                retrieved_docs, system_context, user_context,
+                chat_history, question, prefix_sections
+            )
         except Exception as e:
             logger.error(f"Failed to build prompt: {e}")
             raise RAGException(f"Prompt building failed: {e}")
 
+    def _assemble_prompt(
+        self,
+        retrieved_docs: Union[str, List[str]],
+        system_context: str,
+        user_context: Dict[str, Any],
+        chat_history: List[Dict[str, str]],
+        question: str,
+        prefix_sections: Optional[List[str]] = None
+    ) -> str:
+        """Assemble the prompt sections; tracing lives in _build_prompt"""
+        # Sanitize all inputs; chunk lists become hashable tuples so
+        # the context cache can key on them cheaply
+        if not isinstance(retrieved_docs, str):
+            retrieved_docs = tuple(retrieved_docs)
+        retrieved_docs = self._prepare_context(retrieved_docs)
+        question = self._sanitize_input(question)
+
+        # Build sections; aquery passes prefix_sections it assembled
+        # concurrently with retrieval
+        if prefix_sections is None:
+            prefix_sections = self._build_prefix_sections(
+                system_context, user_context, chat_history
+            )
+        sections = list(prefix_sections)
+
+        if retrieved_docs:
+            sections.append(f"Relevant Documents:\n{retrieved_docs}")
+
+        sections.append(f"Question: {question}")
+        sections.append("Answer:")
+
+        prompt = "\n\n".join(sections)
+
+        # Validate prompt length
+        if len(prompt) > self.max_prompt_length:
+            logger.warning(f"Prompt length ({len(prompt)}) exceeds maximum ({self.max_prompt_length})")
+            # Truncate retrieved docs to fit
+            excess = len(prompt) - self.max_prompt_length
+            if len(retrieved_docs) > excess:
+                retrieved_docs = retrieved_docs[:len(retrieved_docs) - excess - 100] + "...[truncated]"
+                # Rebuild prompt
+                sections = [s for s in sections if not s.startswith("Relevant Documents:")]
+                sections.insert(-2, f"Relevant Documents:\n{retrieved_docs}")
+                prompt = "\n\n".join(sections)
+
+        return prompt
+
+    @functools.lru_cache(maxsize=512)
+    def _prepare_context(self, retrieved_docs: Union[str, tuple]) -> str:
+        """Sanitize and truncate a context block, cached by content.
+
+        Different questions often retrieve the same chunk set, and the
+        regex sweep over a multi-KB string is the expensive part of prompt
+        assembly — repeat context blocks skip it. A stable context prefix
+        also helps the backend's prompt-prefix KV cache, since the volatile
+        question sits at the end of the prompt.
+        """
+        if not isinstance(retrieved_docs, str):
+            retrieved_docs = "\n\n".join(retrieved_docs)
+        retrieved_docs = self._sanitize_input(retrieved_docs)
+        if len(retrieved_docs) > self.max_context_length:
+            retrieved_docs = retrieved_docs[:self.max_context_length] + "...[truncated]"
+            logger.warning(f"Context truncated to {self.max_context_length} characters")
+        return retrieved_docs
+
     def _format_user_context(self, user_context: Dict[str, Any]) -> str:
         """Format user context for prompt"""
         if not user_context:
@@ -415,19 +848,22 @@ class RAGService:
         
         return ", ".join(formatted_items)
 
+    def _format_messages(self, messages: List[Dict[str, str]]) -> List[str]:
+        """Format chat messages into prompt lines"""
+        formatted = []
+        for message in messages:
+            msg_type = message.get('type', 'user').capitalize()
+            content = self._sanitize_input(message.get('content', ''))
+            if content:
+                formatted.append(f"{msg_type}: {content}")
+        return formatted
+
     def _format_chat_history(self, chat_history: List[Dict[str, str]]) -> str:
         """Format chat history for prompt"""
         if not chat_history:
             return ""
-        
-        formatted_history = []
-        for message in chat_history[-10:]:  # Limit to last 10 messages
-            msg_type = message.get('type', 'user').capitalize()
-            content = self._sanitize_input(message.get('content', ''))
-            if content:
-                formatted_history.append(f"{msg_type}: {content}")
-        
-        return "\n".join(formatted_history)
+        # Limit to last 10 messages
+        return "\n".join(self._format_messages(chat_history[-10:]))
 
     def query_minimal(self, question: str, max_results: int = 3) -> Dict[str, Any]:
         """Minimal query implementation with proper error handling"""
@@ -447,6 +883,133 @@ class RAGService:
                 logger.error(f"Minimal query failed: {e}")
                 raise RAGException(f"Minimal query failed: {e}")
 
+    def query_batch(
+        self,
+        queries: List[str],
+        max_results: int = 5,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Answer several questions with one LLM round trip per sub-batch.
+
+        Row marshaling: N questions share a single /api/generate call, so
+        connection overhead and the shared context prefill are amortized
+        across the batch instead of paid per question. Sub-batch size is
+        capped by ROW_MARSHAL_BATCH — gains flatten out past a handful of
+        questions as the combined response grows.
+        """
+        if not queries:
+            return []
+
+        batch_size = getattr(settings, 'ROW_MARSHAL_BATCH', 6)
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(queries), batch_size):
+            results.extend(self._query_marshaled(
+                queries[start:start + batch_size],
+                max_results=max_results,
+                temperature=temperature,
+                max_tokens=max_tokens
+            ))
+        return results
+
+    def _query_marshaled(
+        self,
+        queries: List[str],
+        max_results: int,
+        temperature: Optional[float],
+        max_tokens: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """Run one marshaled sub-batch; falls back to per-query calls."""
+        config = QueryConfig(
+            max_results=max_results,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        for q in queries:
+            self._validate_query_input(q, config)
+        queries = [self._sanitize_input(q) for q in queries]
+
+        if len(queries) == 1:
+            return [self.query(queries[0], config=config)]
+
+        with self._query_context(QueryType.STANDARD):
+            start_time = time.time()
+
+            # Retrieve per question, deduping chunks shared across questions
+            # so the combined context doesn't repeat them
+            per_query_sources: List[List[Dict[str, Any]]] = []
+            context_chunks: List[str] = []
+            seen_chunks = set()
+            for q in queries:
+                context_sections = self._retrieve_context(q, config)
+                sources = context_sections.get("sources", [])
+                per_query_sources.append(sources)
+                for src in sources:
+                    chunk_key = src.get("metadata", {}).get("chunk_id") or src.get("content")
+                    if chunk_key in seen_chunks:
+                        continue
+                    seen_chunks.add(chunk_key)
+                    context_chunks.append(src.get("content", ""))
+
+            question_block = "\n".join(
+                f"### Q{i}: {q}" for i, q in enumerate(queries, start=1)
+            )
+            prompt = self._build_prompt(
+                retrieved_docs="\n\n".join(context_chunks),
+                system_context=(
+                    f"{self.default_system_prompt} Answer each numbered question "
+                    f"using the provided documents. Respond ONLY with a JSON array "
+                    f"of {len(queries)} strings, where element i answers Qi+1."
+                ),
+                user_context={},
+                chat_history=[],
+                question=question_block,
+            )
+
+            # Oversized batches lose the marshaling benefit to truncation;
+            # answer them one at a time instead
+            if len(prompt) > self.max_prompt_length:
+                logger.warning("Marshaled prompt too long, falling back to per-query calls")
+                return [self.query(q, config=config) for q in queries]
+
+            try:
+                combined = self.llm_service.generate_response(
+                    prompt,
+                    stream=False,
+                    temperature=config.temperature,
+                    max_tokens=config.max_tokens
+                )
+                answers = self._parse_marshaled_answers(combined, len(queries))
+            except (LLMException, ValueError) as e:
+                logger.warning(f"Marshaled query failed ({e}), falling back to per-query calls")
+                return [self.query(q, config=config) for q in queries]
+
+            processing_time = time.time() - start_time
+            return [
+                {
+                    "response": answer,
+                    "sources": sources,
+                    "num_sources": len(sources),
+                    "processing_time": processing_time,
+                }
+                for answer, sources in zip(answers, per_query_sources)
+            ]
+
+    @staticmethod
+    def _parse_marshaled_answers(combined: str, expected: int) -> List[str]:
+        """Extract the JSON answer array from a marshaled response"""
+        start = combined.find("[")
+        end = combined.rfind("]")
+        if start < 0 or end <= start:
+            raise ValueError("no JSON array in marshaled response")
+        answers = orjson.loads(combined[start:end + 1])
+        if not isinstance(answers, list) or len(answers) != expected:
+            raise ValueError(
+                f"expected {expected} answers, got "
+                f"{len(answers) if isinstance(answers, list) else type(answers).__name__}"
+            )
+        return [str(a) for a in answers]
+
     def query_with_sanity_check(
         self,
         question: str,
@@ -507,34 +1070,42 @@ class RAGService:
         
         try:
             with tracer.start_as_current_span("get_status"):
-                # Get component statuses
-                vector_ready = self.vector_store_is_ready()
-                llm_available = self.llm_service.is_available()
-                
-                # Get detailed information
-                vector_store_stats = {}
-                llm_info = {}
-                ingested_files_count = 0
-                
-                try:
-                    vector_store_stats = self.vector_service.get_stats()
-                except Exception as e:
-                    logger.warning(f"Failed to get vector store stats: {e}")
-                    vector_store_stats = {"error": str(e)}
-                
-                try:
-                    llm_info = self.llm_service.get_model_info()
-                except Exception as e:
-                    logger.warning(f"Failed to get LLM info: {e}")
-                    llm_info = {"error": str(e)}
-                
-                try:
-                    if hasattr(self.vector_store, "get_ingested_files"):
-                        ingested_files = self.vector_store.get_ingested_files()
-                        ingested_files_count = len(ingested_files)
-                except Exception as e:
-                    logger.warning(f"Failed to get ingested files count: {e}")
-                
+                # Each component check is an independent (potentially network)
+                # round-trip; fan them out on the pool instead of serializing
+                def _get_stats():
+                    try:
+                        return self.vector_service.get_stats()
+                    except Exception as e:
+                        logger.warning(f"Failed to get vector store stats: {e}")
+                        return {"error": str(e)}
+
+                def _get_llm_info():
+                    try:
+                        return self.llm_service.get_model_info()
+                    except Exception as e:
+                        logger.warning(f"Failed to get LLM info: {e}")
+                        return {"error": str(e)}
+
+                def _count_ingested():
+                    try:
+                        if self._get_ingested_files_fn is not None:
+                            return len(self._get_ingested_files_fn())
+                    except Exception as e:
+                        logger.warning(f"Failed to get ingested files count: {e}")
+                    return 0
+
+                ready_future = self._executor.submit(self.vector_store_is_ready)
+                available_future = self._executor.submit(self.llm_service.is_available)
+                stats_future = self._executor.submit(_get_stats)
+                llm_info_future = self._executor.submit(_get_llm_info)
+                ingested_count = _count_ingested()
+
+                vector_ready = ready_future.result()
+                llm_available = available_future.result()
+                vector_store_stats = stats_future.result()
+                llm_info = llm_info_future.result()
+                ingested_files_count = ingested_count
+
                 # Determine overall status
                 if vector_ready and llm_available:
                     status = RAGStatus.HEALTHY.value
@@ -613,6 +1184,12 @@ class RAGService:
                 self.vector_service.clear_cache()
                 
                 # Clear internal caches
+                with self._response_cache_lock:
+                    self._response_cache.clear()
+                self._prepare_context.cache_clear()
+                with self._history_cache_lock:
+                    self._history_cache.clear()
+                semantic_cache.clear_all()
                 self._status_cache = {}
                 self._last_status_check = 0
                 
@@ -651,6 +1228,8 @@ class RAGService:
             # Close LLM service
             if hasattr(self.llm_service, 'close'):
                 self.llm_service.close()
+
+            self._executor.shutdown(wait=False)
             
             # Clear caches
             self.clear_cache()
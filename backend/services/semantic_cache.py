@@ -0,0 +1,156 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from prometheus_client import Counter
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Metrics
+semantic_cache_hits = Counter('semantic_cache_hits_total', 'Total number of semantic cache hits')
+semantic_cache_misses = Counter('semantic_cache_misses_total', 'Total number of semantic cache misses')
+
+class SemanticCache:
+    """Approximate query cache based on random-projection LSH.
+
+    Stores (question embedding, response) pairs. A lookup hashes the query
+    embedding into `n_tables` buckets of `n_bits` sign bits each, then does
+    an exact cosine check against the candidate vectors from those buckets.
+    A candidate above the cosine threshold returns its cached response, so
+    paraphrased questions skip retrieval and generation entirely.
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        n_tables: int = 8,
+        n_bits: int = 16,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.dim = dim
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.threshold = threshold if threshold is not None else settings.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_SIZE
+
+        self._planes: Optional[np.ndarray] = None
+        self._tables: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(n_tables)]
+        self._entries: Dict[int, Tuple[np.ndarray, Any, List[Tuple[int, int]]]] = {}
+        self._insertion_order: List[int] = []
+        self._next_id = 0
+        # Threading lock so the sync RAG path (threadpool / CLI) and the
+        # async endpoints share one cache; operations are short numpy calls
+        self._lock = threading.Lock()
+
+        if dim is not None:
+            self._init_planes(dim)
+
+    def _init_planes(self, dim: int) -> None:
+        """Initialize the Gaussian projection matrices for a given dimension"""
+        rng = np.random.default_rng(42)
+        self._planes = rng.standard_normal((self.n_tables, self.n_bits, dim)).astype(np.float32)
+        self.dim = dim
+
+    @staticmethod
+    def _normalize(embedding: Any) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    def _hash(self, vec: np.ndarray) -> List[int]:
+        """Hash a normalized vector to one bucket id per table"""
+        # (n_tables, n_bits) sign bits packed into ints
+        bits = (self._planes @ vec) > 0
+        keys = []
+        for table_bits in bits:
+            key = 0
+            for bit in table_bits:
+                key = (key << 1) | int(bit)
+            keys.append(key)
+        return keys
+
+    def lookup(self, embedding: Any) -> Optional[Any]:
+        """Return a cached response whose question is semantically close, or None"""
+        vec = self._normalize(embedding)
+        with self._lock:
+            if self._planes is None or not self._entries:
+                semantic_cache_misses.inc()
+                return None
+
+            candidates = set()
+            for table, key in zip(self._tables, self._hash(vec)):
+                candidates.update(table.get(key, ()))
+
+            if not candidates:
+                semantic_cache_misses.inc()
+                return None
+
+            candidate_ids = list(candidates)
+            # Stored vectors are float16; widen the small candidate matrix
+            # for the exact cosine check so precision is unaffected
+            matrix = np.stack([self._entries[i][0] for i in candidate_ids]).astype(np.float32)
+            similarities = matrix @ vec
+            best = int(np.argmax(similarities))
+
+            if similarities[best] >= self.threshold:
+                semantic_cache_hits.inc()
+                return self._entries[candidate_ids[best]][1]
+
+        semantic_cache_misses.inc()
+        return None
+
+    def insert(self, embedding: Any, response: Any) -> None:
+        """Store a response under its question embedding"""
+        vec = self._normalize(embedding)
+        with self._lock:
+            if self._planes is None:
+                self._init_planes(vec.shape[0])
+
+            entry_id = self._next_id
+            self._next_id += 1
+
+            bucket_refs = []
+            for table_idx, key in enumerate(self._hash(vec)):
+                self._tables[table_idx][key].append(entry_id)
+                bucket_refs.append((table_idx, key))
+
+            # Normalized unit vectors survive float16 with ~1e-3 error, well
+            # inside the similarity threshold; halves resident cache bytes
+            self._entries[entry_id] = (vec.astype(np.float16), response, bucket_refs)
+            self._insertion_order.append(entry_id)
+
+            # Evict oldest entries once over capacity
+            while len(self._insertion_order) > self.max_entries:
+                oldest = self._insertion_order.pop(0)
+                _, _, refs = self._entries.pop(oldest)
+                for table_idx, key in refs:
+                    bucket = self._tables[table_idx].get(key)
+                    if bucket and oldest in bucket:
+                        bucket.remove(oldest)
+
+    def clear_all(self) -> None:
+        """Drop all cached entries"""
+        with self._lock:
+            self._tables = [defaultdict(list) for _ in range(self.n_tables)]
+            self._entries = {}
+            self._insertion_order = []
+
+    # Async conveniences for the endpoint layer
+    async def get(self, embedding: Any) -> Optional[Any]:
+        return self.lookup(embedding)
+
+    async def put(self, embedding: Any, response: Any) -> None:
+        self.insert(embedding, response)
+
+    async def clear(self) -> None:
+        self.clear_all()
+
+# Shared cache instance used by the query endpoints
+semantic_cache = SemanticCache()
@@ -2,11 +2,12 @@ import os
 import json
 import logging
 from pathlib import Path
-from typing import List, Set, Dict, Any, Optional, Union
+from typing import List, Set, Dict, Any, Optional, Tuple, Union
 from functools import lru_cache
 from datetime import datetime
 import hashlib
 import asyncio
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from dataclasses import dataclass
@@ -17,6 +18,7 @@ from opentelemetry import trace
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.document_loaders import TextLoader, PyPDFLoader, UnstructuredMarkdownLoader
+from langchain_core.embeddings import Embeddings
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
@@ -46,10 +48,49 @@ class DocumentInfo:
     chunk_count: int
     last_modified: float
 
+@lru_cache(maxsize=1)
+def _shared_embeddings() -> Embeddings:
+    """Build the embedding model once per process.
+
+    The MiniLM weights are ~90 MB and take a couple of seconds to load, so
+    every VectorStoreService instance (API singleton, CLI entry point,
+    ad-hoc scripts) shares the same model and tokenizer.
+    """
+    try:
+        embeddings = None
+        if settings.USE_ONNX_EMBEDDINGS:
+            try:
+                from services.onnx_embeddings import OnnxEmbeddings
+                embeddings = OnnxEmbeddings()
+            except VectorStoreException as e:
+                logger.warning(f"ONNX embeddings unavailable, falling back to PyTorch: {e}")
+        if embeddings is None:
+            embeddings = HuggingFaceEmbeddings(
+                model_name=settings.EMBEDDING_MODEL,
+                model_kwargs={'device': settings.EMBEDDING_DEVICE},
+                encode_kwargs={
+                    'normalize_embeddings': True,  # Better retrieval performance
+                    # Match the ingest micro-batch size so SentenceTransformers
+                    # doesn't re-slice our batches with its default of 32
+                    'batch_size': settings.EMBEDDING_BATCH_SIZE,
+                }
+            )
+        # Test embeddings with a sample text
+        test_embedding = embeddings.embed_query("test")
+        if not test_embedding:
+            raise ValueError("Embedding model failed to generate embeddings")
+        logger.info(f"Embeddings initialized successfully with model: {settings.EMBEDDING_MODEL}")
+        return embeddings
+    except Exception as e:
+        logger.error(f"Failed to initialize embeddings: {e}")
+        raise VectorStoreException(f"Embedding initialization failed: {e}")
+
 class VectorStoreService:
     """Enhanced document storage and retrieval using ChromaDB with improved reliability, monitoring, and performance"""
 
     SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".md", ".docx", ".html"}
+    # Delta-log entries tolerated before rewriting the metadata snapshot
+    _LOG_COMPACT_THRESHOLD = 1000
     LOADERS = {
         ".txt": TextLoader,
         ".pdf": PyPDFLoader,
@@ -63,27 +104,26 @@ class VectorStoreService:
         self.max_workers = max_workers
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self._metadata_lock = Lock()
+        self._metadata_log_path = settings.METADATA_FILE.with_suffix(".log")
+        self._log_entries = 0
+        self._faiss_store = None
+        self._binary_index = None
+        # Bumped whenever the collection changes; lets callers cache
+        # ingest-dependent views and invalidate cheaply
+        self.ingest_version = 0
         self._ensure_directories()
         self._load_metadata()
         self._initialize_vectorstore()
-
-    def _initialize_embeddings(self) -> HuggingFaceEmbeddings:
+        self._known_chunk_ids: Set[str] = self._load_chunk_ids()
+        self._build_search_indexes()
+        self._batched_retriever = None
+        if settings.RETRIEVAL_BATCH_WINDOW_MS > 0:
+            from services.batched_retriever import BatchedRetriever
+            self._batched_retriever = BatchedRetriever(self)
+
+    def _initialize_embeddings(self) -> Embeddings:
         """Initialize embeddings with error handling and validation"""
-        try:
-            embeddings = HuggingFaceEmbeddings(
-                model_name=settings.EMBEDDING_MODEL,
-                model_kwargs={'device': 'cpu'},  # Explicit device setting
-                encode_kwargs={'normalize_embeddings': True}  # Better retrieval performance
-            )
-            # Test embeddings with a sample text
-            test_embedding = embeddings.embed_query("test")
-            if not test_embedding:
-                raise ValueError("Embedding model failed to generate embeddings")
-            logger.info(f"Embeddings initialized successfully with model: {settings.EMBEDDING_MODEL}")
-            return embeddings
-        except Exception as e:
-            logger.error(f"Failed to initialize embeddings: {e}")
-            raise VectorStoreException(f"Embedding initialization failed: {e}")
+        return _shared_embeddings()
 
     def _ensure_directories(self):
         """Ensure all required directories exist"""
@@ -128,7 +168,7 @@ class VectorStoreService:
                             chunk_count=0,
                             last_modified=0
                         ) for filename in data}
-                        self._save_metadata()  # Upgrade metadata format
+                        self._write_snapshot()  # Upgrade metadata format
                     else:
                         # New format
                         self.ingested_files = {
@@ -137,7 +177,8 @@ class VectorStoreService:
                         }
                 else:
                     self.ingested_files = {}
-                
+
+                self._replay_metadata_log()
                 logger.info(f"Loaded metadata for {len(self.ingested_files)} files")
         except Exception as e:
             logger.error(f"Failed to load metadata: {e}")
@@ -163,25 +204,68 @@ class VectorStoreService:
             self.ingested_files = {}
 
     def _save_metadata(self):
-        """Save metadata with backup"""
+        """Save a full metadata snapshot with backup"""
         try:
             with self._metadata_lock:
-                # Create backup first
-                backup_path = settings.CHROMA_DB_PATH.parent / "backups" / "metadata_backup.json"
-                if settings.METADATA_FILE.exists():
-                    import shutil
-                    shutil.copy2(settings.METADATA_FILE, backup_path)
-                
-                # Save current metadata
-                data = {
-                    filename: info.__dict__ 
-                    for filename, info in self.ingested_files.items()
-                }
-                with open(settings.METADATA_FILE, "w") as f:
-                    json.dump(data, f, indent=2)
+                self._write_snapshot()
         except Exception as e:
             logger.error(f"Failed to save metadata: {e}")
 
+    def _write_snapshot(self):
+        """Write the full snapshot and truncate the delta log (lock held by caller)"""
+        # Create backup first
+        backup_path = settings.CHROMA_DB_PATH.parent / "backups" / "metadata_backup.json"
+        if settings.METADATA_FILE.exists():
+            import shutil
+            shutil.copy2(settings.METADATA_FILE, backup_path)
+
+        # Save current metadata
+        data = {
+            filename: info.__dict__
+            for filename, info in self.ingested_files.items()
+        }
+        with open(settings.METADATA_FILE, "w") as f:
+            json.dump(data, f, indent=2)
+
+        # Snapshot subsumes the delta log
+        self._metadata_log_path.unlink(missing_ok=True)
+        self._log_entries = 0
+
+    def _append_metadata_log(self, doc_infos: List[DocumentInfo]):
+        """Append newly ingested files to the delta log (lock held by caller).
+
+        Rewriting the full JSON snapshot per flush costs O(N^2) bytes over a
+        long ingest run; appending one JSON line per file is O(N), and the
+        snapshot is compacted once the log grows past the threshold.
+        """
+        with open(self._metadata_log_path, "ab") as f:
+            for info in doc_infos:
+                f.write(json.dumps({info.filename: info.__dict__}).encode() + b"\n")
+        self._log_entries += len(doc_infos)
+        if self._log_entries >= self._LOG_COMPACT_THRESHOLD:
+            self._write_snapshot()
+
+    def _replay_metadata_log(self):
+        """Apply delta-log entries on top of the loaded snapshot"""
+        if not self._metadata_log_path.exists():
+            return
+        try:
+            with open(self._metadata_log_path, "rb") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Skipping corrupt metadata log line")
+                        continue
+                    for filename, info in entry.items():
+                        self.ingested_files[filename] = DocumentInfo(**info)
+                        self._log_entries += 1
+        except Exception as e:
+            logger.error(f"Failed to replay metadata log: {e}")
+
     def _initialize_vectorstore(self):
         """Initialize vector store with retry logic"""
         max_retries = 3
@@ -210,6 +294,73 @@ class VectorStoreService:
                 import time
                 time.sleep(2 ** attempt)
 
+    def _load_chunk_ids(self) -> Set[str]:
+        """Fetch the content-hash ids already in the collection"""
+        try:
+            return set(self.vectorstore._collection.get(include=[])["ids"])
+        except Exception as e:
+            logger.warning(f"Could not load existing chunk ids: {e}")
+            return set()
+
+    def _collection_snapshot(self):
+        """Fetch all embeddings and their Documents from the Chroma collection"""
+        data = self.vectorstore._collection.get(
+            include=["embeddings", "documents", "metadatas"]
+        )
+        embeddings = data.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            return None, None
+
+        payloads = [
+            Document(page_content=doc, metadata=meta or {})
+            for doc, meta in zip(data["documents"], data["metadatas"])
+        ]
+        return embeddings, payloads
+
+    def _build_faiss_index(self):
+        """Mirror the Chroma collection into a FAISS IVF+PQ index for search"""
+        try:
+            from services.faiss_store import FaissStore
+
+            embeddings, payloads = self._collection_snapshot()
+            if embeddings is None:
+                logger.info("No embeddings in collection yet; skipping FAISS index build")
+                self._faiss_store = None
+                return
+
+            store = FaissStore(dim=len(embeddings[0]))
+            store.build(embeddings, payloads)
+            self._faiss_store = store
+            logger.info(f"FAISS index built over {len(store)} vectors")
+        except Exception as e:
+            logger.warning(f"FAISS index build failed, falling back to Chroma search: {e}")
+            self._faiss_store = None
+
+    def _build_binary_index(self):
+        """Mirror the Chroma collection into a binary-quantized rerank index"""
+        try:
+            from services.binary_index import BinaryIndex
+
+            embeddings, payloads = self._collection_snapshot()
+            if embeddings is None:
+                logger.info("No embeddings in collection yet; skipping binary index build")
+                self._binary_index = None
+                return
+
+            index = BinaryIndex()
+            index.build(embeddings, payloads)
+            self._binary_index = index
+        except Exception as e:
+            logger.warning(f"Binary index build failed, falling back to Chroma search: {e}")
+            self._binary_index = None
+
+    def _build_search_indexes(self):
+        """Build whichever optional search indexes are enabled in settings"""
+        if settings.USE_FAISS_INDEX:
+            self._build_faiss_index()
+        if settings.USE_BINARY_INDEX:
+            self._build_binary_index()
+
     @contextmanager
     def _operation_metrics(self, operation: str):
         """Context manager for operation metrics"""
@@ -235,18 +386,53 @@ class VectorStoreService:
                 span.set_attribute("score_threshold", score_threshold)
 
                 with self._operation_metrics("search"):
+                    # One (cached) forward pass for the query; every backend
+                    # below searches by vector so Chroma never re-embeds
+                    query_vector = self.embed_query(query)
                     if score_threshold > 0:
                         # Use similarity search with score threshold
-                        results = self.vectorstore.similarity_search_with_score(query, k=k)
+                        results = self.vectorstore.similarity_search_with_score_by_vector(
+                            query_vector, k=k
+                        )
                         return [doc for doc, score in results if score >= score_threshold]
-                    else:
-                        return self.vectorstore.similarity_search(query, k=k)
-                        
+                    return self.search_by_vector(query_vector, k)
+
         except Exception as e:
             cache_misses.inc()
             logger.error(f"Search failed: {e}")
             raise VectorStoreException(f"Document search failed: {e}")
 
+    def search_by_vector(self, query_vector: List[float], k: Optional[int] = None) -> List[Document]:
+        """Search against the fastest available backend with a precomputed vector"""
+        if not self.vectorstore:
+            raise VectorStoreException("Vector store not initialized")
+
+        if k is None:
+            k = settings.SIMILARITY_K
+
+        try:
+            if self._binary_index is not None:
+                hits = self._binary_index.search(query_vector, k)
+                return [doc for doc, score in hits]
+            if self._faiss_store is not None:
+                hits = self._faiss_store.search(query_vector, k)
+                return [doc for doc, score in hits]
+            return self.vectorstore.similarity_search_by_vector(query_vector, k=k)
+
+        except Exception as e:
+            cache_misses.inc()
+            logger.error(f"Search failed: {e}")
+            raise VectorStoreException(f"Document search failed: {e}")
+
+    @lru_cache(maxsize=2048)
+    def _embed_query_cached(self, text: str) -> Tuple[float, ...]:
+        # Tuples so cached vectors are immutable across callers
+        return tuple(self.embeddings.embed_query(text))
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query string, caching repeat queries' vectors"""
+        return list(self._embed_query_cached(text))
+
     def _needs_reingestion(self, filepath: Path, filename: str) -> bool:
         """Check if document needs reingestion based on file changes"""
         if filename not in self.ingested_files:
@@ -263,90 +449,220 @@ class VectorStoreService:
             doc_info.file_hash != current_hash
         )
 
-    def ingest_document(self, filepath: Path, force_reingest: bool = False) -> bool:
-        """Enhanced document ingestion with change detection and better error handling"""
-        try:
-            filename = filepath.name
-            ext = filepath.suffix.lower()
+    def _scan_documents(self) -> List[Path]:
+        """List ingestible files via os.scandir.
+
+        DirEntry caches the stat from the directory read, and filtering on
+        suffix here keeps unsupported files out of the prepare pool
+        entirely — cheaper than iterdir + per-path stat + late filtering.
+        """
+        suffixes = tuple(self.SUPPORTED_EXTENSIONS)
+        paths: List[Path] = []
+        with os.scandir(settings.DOCUMENTS_PATH) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                if entry.name.lower().endswith(suffixes):
+                    paths.append(Path(entry.path))
+        return paths
+
+    def _iter_documents(self, filepath: Path, ext: str):
+        """Yield Documents one unit at a time.
+
+        PDFs stream page by page via pypdf directly, so a large file's raw
+        text is never fully materialized; other formats fall back to their
+        langchain loader.
+        """
+        if ext == ".pdf":
+            from pypdf import PdfReader
+            reader = PdfReader(str(filepath))
+            for page_num, page in enumerate(reader.pages):
+                text = page.extract_text() or ""
+                if text.strip():
+                    yield Document(page_content=text, metadata={"page": page_num})
+            return
+
+        loader_class = self.LOADERS.get(ext)
+        if not loader_class:
+            return
+        for doc in loader_class(str(filepath)).load():
+            yield doc
+
+    def _prepare_document(
+        self, filepath: Path, force_reingest: bool = False
+    ) -> Optional[Tuple[DocumentInfo, Optional[List[Document]]]]:
+        """Load and chunk a document without touching the vector store.
+
+        Returns None if the file cannot be ingested, (doc_info, None) if the
+        file is unchanged, or (doc_info, chunks) with chunks ready to add.
+        """
+        filename = filepath.name
+        ext = filepath.suffix.lower()
+
+        if ext not in self.SUPPORTED_EXTENSIONS:
+            logger.warning(f"Unsupported file extension: {ext}")
+            return None
+
+        if not filepath.exists():
+            logger.error(f"File does not exist: {filepath}")
+            return None
+
+        # Check if reingestion is needed
+        if not force_reingest and not self._needs_reingestion(filepath, filename):
+            logger.info(f"File unchanged, skipping: {filename}")
+            return self.ingested_files[filename], None
+
+        # Remove existing document if reingestting
+        if filename in self.ingested_files and force_reingest:
+            self._remove_document_from_store(filename)
+
+        if ext != ".pdf" and ext not in self.LOADERS:
+            logger.error(f"No loader available for extension: {ext}")
+            return None
+
+        # Enhanced metadata
+        file_stat = filepath.stat()
+        file_hash = self._calculate_file_hash(filepath)
+        base_metadata = {
+            "source": filename,
+            "file_path": str(filepath),
+            "file_size": file_stat.st_size,
+            "file_hash": file_hash,
+            "ingested_at": datetime.now().isoformat(),
+            "last_modified": file_stat.st_mtime,
+            "file_extension": ext
+        }
+
+        # Stream units (PDF pages, loader documents) through the splitter
+        # one at a time: only the current unit's raw text plus the chunk
+        # list is resident, not the whole file's text twice over
+        splitter = self._get_text_splitter(ext)
+        chunks: List[Document] = []
+        loaded_any = False
+        for doc in self._iter_documents(filepath, ext):
+            loaded_any = True
+            doc.metadata.update(base_metadata)
+            chunks.extend(splitter.split_documents([doc]))
+
+        if not loaded_any:
+            logger.warning(f"No content loaded from {filename}")
+            return None
+
+        if not chunks:
+            logger.warning(f"No chunks created from {filename}")
+            return None
+
+        # Stable content-derived id per chunk so identical chunks keep the
+        # same identity across queries (used for LLM prefix-cache hints)
+        for chunk in chunks:
+            chunk.metadata["chunk_id"] = hashlib.sha1(
+                chunk.page_content.encode()
+            ).hexdigest()[:16]
+
+        doc_info = DocumentInfo(
+            filename=filename,
+            filepath=str(filepath),
+            file_size=file_stat.st_size,
+            file_hash=file_hash,
+            ingested_at=datetime.now().isoformat(),
+            chunk_count=len(chunks),
+            last_modified=file_stat.st_mtime
+        )
+        return doc_info, chunks
+
+    def _embed_texts_batched(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in length-sorted micro-batches.
+
+        Sorting by length first keeps each batch's tensors near-uniform, so
+        the SentenceTransformers backend wastes little compute on padding;
+        each EMBEDDING_BATCH_SIZE slice becomes one forward pass instead of
+        one pass per text. Results are returned in the original order.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            vectors = self.embeddings.embed_documents([texts[i] for i in indices])
+            for i, vector in zip(indices, vectors):
+                embeddings[i] = vector
+        return embeddings
+
+    def _flush_batch(self, chunks: List[Document], doc_infos: List[DocumentInfo], persist: bool = True):
+        """Add a batch of chunks to the vector store and commit metadata.
+
+        Bulk ingest passes persist=False for intermediate flushes and calls
+        flush() once at the end — Chroma's persist rewrites the whole index,
+        so per-batch persists make ingest quadratic in corpus size.
+        """
+        if chunks:
+            # Shared boilerplate (headers, footers) hashes to chunk_ids that
+            # are already in the collection; skip those before paying for
+            # their embeddings. Also collapses duplicates within the batch.
+            novel: List[Document] = []
+            for chunk in chunks:
+                chunk_id = chunk.metadata["chunk_id"]
+                if chunk_id in self._known_chunk_ids:
+                    continue
+                self._known_chunk_ids.add(chunk_id)
+                novel.append(chunk)
+            if len(novel) < len(chunks):
+                logger.info(f"Skipping {len(chunks) - len(novel)} duplicate chunks")
+            chunks = novel
+
+        if chunks:
+            with self._operation_metrics("ingest"):
+                # Embed ourselves (batched) and upsert with the content-hash
+                # chunk ids: add_documents would embed one call per slice and
+                # upserting on chunk_id dedupes identical chunks for free
+                texts = [chunk.page_content for chunk in chunks]
+                vectors = self._embed_texts_batched(texts)
+                ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+                metadatas = [chunk.metadata for chunk in chunks]
+
+                batch_size = settings.INGEST_BATCH_SIZE
+                for start in range(0, len(chunks), batch_size):
+                    sl = slice(start, start + batch_size)
+                    self.vectorstore._collection.upsert(
+                        ids=ids[sl],
+                        embeddings=vectors[sl],
+                        documents=texts[sl],
+                        metadatas=metadatas[sl],
+                    )
 
-            if ext not in self.SUPPORTED_EXTENSIONS:
-                logger.warning(f"Unsupported file extension: {ext}")
-                return False
+        if doc_infos:
+            with self._metadata_lock:
+                for doc_info in doc_infos:
+                    self.ingested_files[doc_info.filename] = doc_info
+                self._append_metadata_log(doc_infos)
+            self.ingest_version += 1
 
-            if not filepath.exists():
-                logger.error(f"File does not exist: {filepath}")
-                return False
+        if chunks and persist:
+            self.flush()
 
-            # Check if reingestion is needed
-            if not force_reingest and not self._needs_reingestion(filepath, filename):
-                logger.info(f"File unchanged, skipping: {filename}")
-                return True
+    def flush(self):
+        """Commit the collection to disk and refresh the optional index mirrors"""
+        self.vectorstore.persist()
+        self._build_search_indexes()
 
+    def ingest_document(self, filepath: Path, force_reingest: bool = False) -> bool:
+        """Enhanced document ingestion with change detection and better error handling"""
+        try:
             with tracer.start_as_current_span("ingest_document") as span:
-                span.set_attribute("filename", filename)
+                span.set_attribute("filename", filepath.name)
                 span.set_attribute("force_reingest", force_reingest)
 
-                # Remove existing document if reingestting
-                if filename in self.ingested_files and force_reingest:
-                    self._remove_document_from_store(filename)
-
-                # Load document
-                loader_class = self.LOADERS.get(ext)
-                if not loader_class:
-                    logger.error(f"No loader available for extension: {ext}")
+                prepared = self._prepare_document(filepath, force_reingest)
+                if prepared is None:
                     return False
 
-                loader = loader_class(str(filepath))
-                documents = loader.load()
-
-                if not documents:
-                    logger.warning(f"No content loaded from {filename}")
-                    return False
+                doc_info, chunks = prepared
+                if chunks is None:
+                    # File unchanged
+                    return True
 
-                # Enhanced metadata
-                file_stat = filepath.stat()
-                file_hash = self._calculate_file_hash(filepath)
-                
-                for doc in documents:
-                    doc.metadata.update({
-                        "source": filename,
-                        "file_path": str(filepath),
-                        "file_size": file_stat.st_size,
-                        "file_hash": file_hash,
-                        "ingested_at": datetime.now().isoformat(),
-                        "last_modified": file_stat.st_mtime,
-                        "file_extension": ext
-                    })
-
-                # Smart chunking based on document type
-                splitter = self._get_text_splitter(ext)
-                chunks = splitter.split_documents(documents)
-
-                if not chunks:
-                    logger.warning(f"No chunks created from {filename}")
-                    return False
-
-                # Add to vector store
-                with self._operation_metrics("ingest"):
-                    self.vectorstore.add_documents(chunks)
-                    self.vectorstore.persist()
-
-                # Update metadata
-                doc_info = DocumentInfo(
-                    filename=filename,
-                    filepath=str(filepath),
-                    file_size=file_stat.st_size,
-                    file_hash=file_hash,
-                    ingested_at=datetime.now().isoformat(),
-                    chunk_count=len(chunks),
-                    last_modified=file_stat.st_mtime
-                )
-                
-                with self._metadata_lock:
-                    self.ingested_files[filename] = doc_info
-                    self._save_metadata()
-
-                logger.info(f"Successfully ingested {filename} ({len(chunks)} chunks)")
+                self._flush_batch(chunks, [doc_info])
+                logger.info(f"Successfully ingested {doc_info.filename} ({len(chunks)} chunks)")
                 return True
 
         except Exception as e:
@@ -399,21 +715,98 @@ class VectorStoreService:
         logger.info(f"Async ingestion completed: {success_count}/{len(tasks)} files successful")
         return success_count
 
+    def _prepare_documents_bounded(self, filepaths, *args):
+        """Yield (filepath, future) pairs with a bounded submission window.
+
+        At most max_workers + 2 prepared files are in flight at once, so
+        the pool never runs arbitrarily far ahead of the embed/upsert
+        consumer and the whole corpus's split chunks cannot pile up in
+        completed futures.
+        """
+        window = self.max_workers + 2
+        pending = deque()
+        for path in filepaths:
+            pending.append((path, self.executor.submit(self._prepare_document, path, *args)))
+            if len(pending) >= window:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
     def ingest_all_documents(self) -> int:
-        """Synchronous batch ingestion with progress tracking"""
+        """Synchronous batch ingestion with progress tracking.
+
+        Chunks are accumulated across files and added to the vector store in
+        batches of INGEST_BATCH_SIZE, which is far faster than per-file adds.
+        """
         count = 0
-        total_files = list(settings.DOCUMENTS_PATH.iterdir())
-        
-        for i, filepath in enumerate(total_files, 1):
-            if filepath.is_file():
-                try:
-                    if self.ingest_document(filepath):
-                        count += 1
-                    logger.info(f"Progress: {i}/{len(total_files)} files processed")
-                except Exception as e:
-                    logger.error(f"Failed to process {filepath}: {e}")
+        added_chunks = 0
+        batch: List[Document] = []
+        pending_infos: List[DocumentInfo] = []
+        files = self._scan_documents()
+
+        # Producer-consumer: document loading and chunking (I/O + parsing)
+        # runs on the service's thread pool while this thread consumes the
+        # prepared chunks into embed/upsert batches, so the embedder never
+        # sits idle waiting for the next file to parse
+        for i, (filepath, future) in enumerate(self._prepare_documents_bounded(files), 1):
+            try:
+                prepared = future.result()
+                if prepared is None:
                     continue
-        
+
+                doc_info, chunks = prepared
+                count += 1
+                if chunks is not None:
+                    batch.extend(chunks)
+                    pending_infos.append(doc_info)
+                    added_chunks += len(chunks)
+
+                if len(batch) >= settings.INGEST_BATCH_SIZE:
+                    self._flush_batch(batch, pending_infos, persist=False)
+                    batch, pending_infos = [], []
+
+                logger.info(f"Progress: {i}/{len(files)} files processed")
+            except Exception as e:
+                document_processing_errors.inc()
+                logger.error(f"Failed to process {filepath}: {e}")
+                continue
+
+        self._flush_batch(batch, pending_infos, persist=False)
+        if added_chunks:
+            # One persist + index rebuild for the whole run
+            self.flush()
+        return count
+
+    def ingest_files(self, filepaths: List[Path], force_reingest: bool = False) -> int:
+        """Ingest a specific batch of files with one flush.
+
+        Coalesces N newly arrived files (e.g. from a directory watcher or a
+        multi-file upload) into a single embed + upsert + persist cycle
+        instead of N per-file persists.
+        """
+        count = 0
+        batch: List[Document] = []
+        pending_infos: List[DocumentInfo] = []
+
+        paths = [Path(p) for p in filepaths]
+        for filepath, future in self._prepare_documents_bounded(paths, force_reingest):
+            try:
+                prepared = future.result()
+                if prepared is None:
+                    continue
+                doc_info, chunks = prepared
+                count += 1
+                if chunks is not None:
+                    batch.extend(chunks)
+                    pending_infos.append(doc_info)
+            except Exception as e:
+                document_processing_errors.inc()
+                logger.error(f"Failed to process {filepath}: {e}")
+                continue
+
+        self._flush_batch(batch, pending_infos, persist=False)
+        if batch:
+            self.flush()
         return count
 
     def get_ingested_files(self) -> List[Dict[str, Any]]:
@@ -460,18 +853,26 @@ class VectorStoreService:
                     results = self.vectorstore.similarity_search_with_score(query, k=k or settings.SIMILARITY_K)
                     documents = [doc for doc, score in results]
                     scores = [score for doc, score in results]
+                elif self._batched_retriever is not None:
+                    # Coalesce with other in-flight searches: one embedding
+                    # forward pass (and one FAISS call) per micro-batch
+                    documents = self._batched_retriever.search(query, k or settings.SIMILARITY_K)
+                    scores = None
                 else:
                     documents = self.search_documents(query, k)
                     scores = None
 
-                doc_text = "\n\n".join(doc.page_content for doc in documents)
-                
+                # Kept as a list; the prompt builder joins exactly once, so
+                # the concatenated copy never exists outside prompt assembly
+                chunks = [doc.page_content for doc in documents]
                 context = {
-                    "retrieved_docs": doc_text,
-                    "retrieved_chunks": [doc.page_content for doc in documents],
+                    "retrieved_docs": chunks,
+                    "retrieved_chunks": chunks,
+                    # Already in the {content, metadata} shape the API returns,
+                    # so endpoints pass sources through without reshaping
                     "sources": [
                         {
-                            "filename": doc.metadata.get("source"),
+                            "content": doc.page_content,
                             "metadata": doc.metadata
                         }
                         for doc in documents
@@ -492,6 +893,7 @@ class VectorStoreService:
     def clear_cache(self):
         """Clear all caches"""
         self.search_documents.cache_clear()
+        self._embed_query_cached.cache_clear()
         logger.info("Caches cleared")
 
     def get_stats(self) -> Dict[str, Any]:
@@ -562,6 +964,10 @@ class VectorStoreService:
         """Context manager exit with cleanup"""
         if self.executor:
             self.executor.shutdown(wait=True)
+        if self._batched_retriever is not None:
+            self._batched_retriever.close()
+        if self._log_entries:
+            self._save_metadata()
         logger.info("VectorStoreService cleanup completed")
 
 # Convenience function for easy initialization
@@ -1,21 +1,85 @@
-from passlib.context import CryptContext
+import asyncio
+import base64
+import hmac
+import json
+import time
 from datetime import datetime, timedelta
-from jose import jwt
+from functools import lru_cache
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError, VerifyMismatchError
 
 SECRET_KEY = "your-secret-key"  # Change this! Use env var in prod
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# HMAC key schedule and header are identical for every token: expand the key
+# pads once at import and clone the state per call instead of re-deriving
+_HMAC_TEMPLATE = hmac.new(SECRET_KEY.encode(), digestmod="sha256")
+_JWT_HEADER = base64.urlsafe_b64encode(
+    json.dumps({"alg": ALGORITHM, "typ": "JWT"}, separators=(",", ":")).encode()
+).rstrip(b"=")
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+# argon2id via the C backend; parameters tuned for interactive logins
+ph = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+
+# Verified against when a login email does not exist, so response time does
+# not reveal whether an account is registered
+DUMMY_HASH = ph.hash("dummy-password-for-timing-equalization")
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return ph.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return ph.verify(hashed_password, plain_password)
+    except (VerifyMismatchError, VerificationError, InvalidHashError):
+        return False
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Run the compute-bound argon2 verification off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, verify_password, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    to_encode.update({"exp": int(expire.timestamp())})
+    payload = _b64url(json.dumps(to_encode, separators=(",", ":"), default=str).encode())
+    signing_input = _JWT_HEADER + b"." + payload
+    h = _HMAC_TEMPLATE.copy()
+    h.update(signing_input)
+    return (signing_input + b"." + _b64url(h.digest())).decode()
+
+@lru_cache(maxsize=8192)
+def _verify_and_decode(token: str) -> dict:
+    """Verify the token signature and decode its claims.
+
+    Cached on the compact token string so repeated requests carrying the
+    same token skip the HMAC entirely after the first verification.
+    Expiry is deliberately NOT checked here — cached hits re-check it in
+    decode_access_token, which is one int compare.
+    """
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+    except ValueError:
+        raise ValueError("Malformed token")
+
+    signing_input = (header_b64 + "." + payload_b64).encode()
+    h = _HMAC_TEMPLATE.copy()
+    h.update(signing_input)
+    if not hmac.compare_digest(_b64url(h.digest()), signature_b64.encode()):
+        raise ValueError("Invalid token signature")
+
+    padded = payload_b64 + "=" * (-len(payload_b64) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded))
+
+def decode_access_token(token: str) -> dict:
+    """Decode and validate an access token, reusing cached verifications"""
+    claims = _verify_and_decode(token)
+    exp = claims.get("exp")
+    if exp is not None and exp < time.time():
+        raise ValueError("Token expired")
+    return claims
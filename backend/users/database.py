@@ -1,11 +1,28 @@
+import os
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-DATABASE_URL = "sqlite+aiosqlite:///./users.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./users.db")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine_kwargs = {"echo": False}
+if DATABASE_URL.startswith("sqlite"):
+    # SQLite keeps its default pooling; the sizing knobs below do not apply
+    pass
+elif os.getenv("DB_USE_NULL_POOL"):
+    # External poolers (e.g. PgBouncer) own the connections; don't double-pool
+    engine_kwargs["poolclass"] = NullPool
+else:
+    engine_kwargs.update(
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+
+engine = create_async_engine(DATABASE_URL, **engine_kwargs)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session